@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blackjack.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the app registry is ready
+from game.sockets import game_socket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == "/ws/game/":
+            await game_socket(scope, receive, send)
+        else:
+            await receive()
+            await send({"type": "websocket.close"})
+    else:
+        await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "game.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -80,19 +82,114 @@ WSGI_APPLICATION = "blackjack.wsgi.application"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'game.authentication.JWTAuthentication',
     ),
 }
 
+# Number of decks in each player's shoe, and the fraction of it dealt
+# before the cut card triggers a reshuffle
+BLACKJACK_SHOE_DECKS = 6
+BLACKJACK_SHOE_PENETRATION = 0.75
+
+# Most spots one player can open against the same dealer hand
+BLACKJACK_MAX_SPOTS = 7
+
+# Games a player needs before they are ranked by win rate
+BLACKJACK_LEADERBOARD_MIN_GAMES = 20
+
+# Counting a player's rank reads every player above them, so ranks are only
+# counted this far down, and players further down get none
+BLACKJACK_LEADERBOARD_RANK_LIMIT = 10000
+
+# Cache for profile and game reads: game.cache.LRUCache keeps them in this
+# process, game.cache.DjangoCache shares them through a backend in CACHES.
+# With LRUCache, another process's writes show up at most ttl seconds later,
+# so use DjangoCache when running more than one worker process.
+BLACKJACK_STATE_CACHE = {
+    'BACKEND': 'game.cache.LRUCache',
+    'OPTIONS': {'max_entries': 10000, 'ttl': 60},
+}
+
+# Balance history rows are inserted in batches of up to MAX_ROWS, at most
+# MAX_DELAY seconds after their game settles. Setting LOG_PATH also logs them
+# to disk until inserted, so a crash loses none. None inserts them right away.
+BLACKJACK_HISTORY_BUFFER = {
+    'MAX_ROWS': 500,
+    'MAX_DELAY': 2.0,
+    'LOG_PATH': None,
+}
+
+# Finished games older than this many days are moved out of the game table
+# by the archive_games command
+BLACKJACK_ARCHIVE_AFTER_DAYS = 30
+
+# Verified JWTs and their users are cached per process for up to TTL seconds,
+# which bounds how long another process takes to see a user deactivated
+BLACKJACK_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+}
+
+# Metrics served at /api/metrics/ can also be written to PATH every INTERVAL
+# seconds, and when the process exits
+BLACKJACK_METRICS_DUMP = {
+    'PATH': None,
+    'INTERVAL': 60,
+}
+
+# /api/metrics/ is served to these client addresses and to staff users only.
+# Behind a proxy the address is the proxy's, so list it or scrape as staff.
+BLACKJACK_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+#
+# BLACKJACK_DATABASE picks a profile: 'sqlite' (the default) is a local file
+# tuned for concurrent writers, 'postgres' a local PostgreSQL server configured
+# by the POSTGRES_* variables, which needs psycopg installed
 
-DATABASES = {
-    "default": {
+BLACKJACK_DATABASE = os.environ.get("BLACKJACK_DATABASE", "sqlite")
+
+DATABASE_PROFILES = {
+    "sqlite": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        # Keeps each thread's connection, and its pragmas, across requests
+        "CONN_MAX_AGE": 600,
+        "OPTIONS": {
+            # Seconds a writer waits for the lock before "database is locked"
+            "timeout": 20,
+        },
+    },
+    "postgres": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "blackjack"),
+        "USER": os.environ.get("POSTGRES_USER", "blackjack"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # Each worker thread keeps its connection open and checks it before
+        # reuse. Under ASGI set POSTGRES_CONN_MAX_AGE=0 and pool with PgBouncer.
+        "CONN_MAX_AGE": int(os.environ.get("POSTGRES_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+    },
+}
+
+DATABASES = {
+    "default": DATABASE_PROFILES[BLACKJACK_DATABASE],
+}
+
+# Run on every new SQLite connection, see game/database.py
+BLACKJACK_SQLITE_PRAGMAS = {
+    # Readers no longer block the writer, nor the writer the readers
+    "journal_mode": "WAL",
+    # Durable at each checkpoint instead of every commit, safe with WAL
+    "synchronous": "NORMAL",
+    # 20 MB page cache, and temporary tables in memory
+    "cache_size": -20000,
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
 }
 
 
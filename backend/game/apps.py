@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class GameConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "game"
+
+    def ready(self):
+        from .database import set_sqlite_pragmas
+        from .history import replay_in_background
+        from .metrics import install_query_timer
+
+        connection_created.connect(set_sqlite_pragmas)
+        connection_created.connect(install_query_timer)
+
+        # Recovers balance history logged by processes that died, once per start
+        replay_in_background()
@@ -0,0 +1,125 @@
+"""
+Keeps the game table down to active and recent games.
+
+Finished games never read their leftover deck again, so strip_decks empties it.
+archive_games moves finished games last updated before a cutoff out of the
+table, as ArchivedGame rows or as lines in a gzipped JSON file, keeping the
+cards, scores, bet, result and replay log of each hand. Both work in batches of
+ids, each in its own short transaction, so they can run next to live traffic.
+Archived games are dropped from the state cache as each batch commits.
+"""
+
+import gzip
+import json
+
+from django.db import connection, transaction
+
+from .cache import game_key, get_state_cache
+from .gameplay import Gameplay
+from .models import ArchivedGame, Game
+
+SUMMARY_FIELDS = (
+    'id', 'player', 'status', 'player_cards', 'dealer_cards',
+    'player_score', 'dealer_score', 'bet', 'session', 'seed', 'log', 'created_at', 'updated_at',
+)
+
+def finished_games():
+    return Game.objects.exclude(status='ACTIVE').order_by('id')
+
+def strip_decks(batch_size=1000):
+    """ Empties the leftover deck of every finished game, returning how many changed """
+    stripped = 0
+    last_id = 0
+
+    while True:
+        ids = list(
+            finished_games().filter(id__gt=last_id).exclude(deck=[])
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return stripped
+
+        stripped += Game.objects.filter(id__in=ids).update(deck=[])
+        last_id = ids[-1]
+
+def encode_cards(cards):
+    return bytes(Gameplay.encode_card(card) for card in cards)
+
+def summarize(game):
+    return ArchivedGame(
+        id=game.id,
+        player_id=game.player_id,
+        status=game.status,
+        player_cards=encode_cards(game.player_cards),
+        dealer_cards=encode_cards(game.dealer_cards),
+        player_score=game.player_score,
+        dealer_score=game.dealer_score,
+        bet=game.bet,
+        session=game.session,
+        seed=game.seed,
+        log=game.log,
+        created_at=game.created_at,
+        finished_at=game.updated_at,
+    )
+
+def to_json(summary):
+    return json.dumps({
+        'id': summary.id,
+        'player': summary.player_id,
+        'status': summary.status,
+        'player_cards': list(summary.player_cards),
+        'dealer_cards': list(summary.dealer_cards),
+        'player_score': summary.player_score,
+        'dealer_score': summary.dealer_score,
+        'bet': summary.bet,
+        'session': str(summary.session) if summary.session else None,
+        'seed': summary.seed,
+        'log': summary.log,
+        'created_at': summary.created_at.isoformat(),
+        'finished_at': summary.finished_at.isoformat(),
+    })
+
+def archive_games(before, batch_size=1000, path=None):
+    """
+    Moves finished games last updated before the given time out of the game
+    table: into ArchivedGame, or appended to the gzipped JSON lines file at
+    path. Returns how many were moved.
+    """
+    moved = 0
+    last_id = 0
+    games = finished_games().filter(updated_at__lt=before).only(*SUMMARY_FIELDS)
+
+    while True:
+        with transaction.atomic():
+            batch = list(games.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return moved
+
+            summaries = [summarize(game) for game in batch]
+            if path:
+                # Written before the delete commits, so a failed batch can
+                # leave duplicate lines but never lose a game
+                with gzip.open(path, 'at') as archive:
+                    archive.writelines(to_json(summary) + '\n' for summary in summaries)
+            else:
+                ArchivedGame.objects.bulk_create(summaries, ignore_conflicts=True)
+
+            Game.objects.filter(id__in=[game.id for game in batch]).delete()
+            get_state_cache().delete_many_on_commit(
+                [game_key(game.player_id, game.id) for game in batch]
+            )
+
+        moved += len(batch)
+        last_id = batch[-1].id
+
+def reclaim_space():
+    """ Returns the space freed by deleted rows to the filesystem, where the database supports it """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'VACUUM ANALYZE {Game._meta.db_table}')
+        else:
+            return False
+
+    return True
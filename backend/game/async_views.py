@@ -0,0 +1,134 @@
+"""
+Async versions of the create/hit/stand/profile endpoints, served at /api/async/
+next to the sync views and meant to run under blackjack/asgi.py.
+
+They do their reads with Django's async ORM, so a request waiting on the
+database doesn't hold a thread. Tokens go through the shared token cache, and
+only one the cache doesn't hold is verified, on a thread. The async ORM has no
+transactions yet, so the writes that must commit together (taking the bet,
+dealing, settling) still run the shared services through sync_to_async.
+"""
+
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import services
+from .authentication import averify_token
+from .cache import game_key, get_state_cache, profile_key
+from .metrics import AUTH_SECONDS, timed
+from .models import Game, Player
+from .serializers import GameSerializer
+from .views import profile_payload
+
+async def authenticate(request):
+    """ Async counterpart of game.authentication.JWTAuthentication, sharing its token cache """
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        raise AuthenticationFailed('Authentication credentials were not provided.')
+
+    user, request.player, _ = await averify_token(raw_token)
+    return user
+
+def async_api_view(method):
+    """ Restricts an async view to one method and authenticates its JWT """
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != method:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+            try:
+                with timed(AUTH_SECONDS):
+                    request.user = await authenticate(request)
+            except (AuthenticationFailed, InvalidToken) as e:
+                detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+                return JsonResponse(detail, status=401)
+
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+async def get_game(request, pk):
+    # The services lock and reload the game and its shoe before acting
+    return await Game.objects.aget(player=request.user, pk=pk)
+
+def game_response(game, status=200):
+    data = dict(GameSerializer(game).data)
+    get_state_cache().set(game_key(game.player_id, game.id), data)
+
+    return JsonResponse(data, status=status)
+
+@async_api_view('POST')
+async def create_game(request):
+    """ Start a new game with a bet """
+
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+
+    bet = body.get('bet', 10)
+    try:
+        # Checked here too, so no bet reaches the database thread unvalidated
+        services.validate_bet(bet)
+        game = await sync_to_async(services.start_game)(request.user, bet)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return game_response(game, status=201)
+
+@async_api_view('POST')
+async def hit(request, pk):
+    """ Player draws another card """
+
+    try:
+        game = await get_game(request, pk)
+    except Game.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    try:
+        await sync_to_async(services.hit)(game)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return game_response(game)
+
+@async_api_view('POST')
+async def stand(request, pk):
+    """ Player stands, dealer plays """
+
+    try:
+        game = await get_game(request, pk)
+    except Game.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    try:
+        await sync_to_async(services.stand)(game)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return game_response(game)
+
+@async_api_view('GET')
+async def get_profile(request):
+    """ Get user profile """
+
+    async def load():
+        return profile_payload(await Player.objects.select_related('user').aget(user=request.user))
+
+    data = await get_state_cache().aget_or_load(profile_key(request.user.id), load)
+
+    return JsonResponse(data)
@@ -0,0 +1,144 @@
+"""
+JWT authentication that verifies each token once per process.
+
+A verified token's user, with their Player row, is kept in a bounded LRU until
+the token expires or settings.BLACKJACK_AUTH_CACHE's TTL runs out, whichever is
+first. Later requests with the same token skip the signature check and the user
+lookup. Saving or deleting a user drops their tokens in this process at once,
+so deactivation and password changes apply right away. Other processes pick
+them up when their own entries expire, at most TTL seconds later.
+
+verify_token and averify_token are the one way to turn a raw token into its
+user, shared by the DRF auth class, the async views and the game socket.
+
+request.player is the Player row as of authentication. Its counters and
+balance can be up to TTL seconds old, so use it to find the player, not to read
+their stats.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt import authentication
+
+from .metrics import AUTH_SECONDS, timed
+from .models import Player
+
+class TokenCache:
+    """ Verified tokens and their users, least recently used evicted first """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.user_tokens = {}
+        self.lock = threading.Lock()
+
+    def get(self, raw_token):
+        """ (user, player, token) for a cached token that hasn't expired, else None """
+        with self.lock:
+            entry = self.entries.get(raw_token)
+            if entry is None:
+                return None
+
+            expires_at, user, player, token = entry
+            if expires_at <= time.time():
+                self._remove(raw_token)
+                return None
+
+            self.entries.move_to_end(raw_token)
+            return user, player, token
+
+    def set(self, raw_token, user, player, token):
+        expires_at = min(token['exp'], time.time() + self.ttl)
+        with self.lock:
+            self.entries[raw_token] = (expires_at, user, player, token)
+            self.entries.move_to_end(raw_token)
+            self.user_tokens.setdefault(user.pk, set()).add(raw_token)
+
+            if len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def revoke_user(self, user_id):
+        """ Drops every cached token of the user """
+        with self.lock:
+            for raw_token in list(self.user_tokens.get(user_id, ())):
+                self._remove(raw_token)
+
+    def revoke_token(self, raw_token):
+        with self.lock:
+            if raw_token in self.entries:
+                self._remove(raw_token)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.user_tokens.clear()
+
+    def _remove(self, raw_token):
+        _, user, _, _ = self.entries.pop(raw_token)
+        tokens = self.user_tokens.get(user.pk)
+        if tokens is not None:
+            tokens.discard(raw_token)
+            if not tokens:
+                del self.user_tokens[user.pk]
+
+token_cache = TokenCache(
+    max_entries=settings.BLACKJACK_AUTH_CACHE['MAX_ENTRIES'],
+    ttl=settings.BLACKJACK_AUTH_CACHE['TTL'],
+)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def revoke_changed_user(sender, instance, **kwargs):
+    token_cache.revoke_user(instance.pk)
+
+def verify_token(raw_token):
+    """
+    (user, player, token) for a raw token, from the cache or else verified and
+    looked up. Raises InvalidToken or AuthenticationFailed, also for an
+    inactive user.
+    """
+    cached = token_cache.get(raw_token)
+    if cached is not None:
+        return cached
+
+    verifier = authentication.JWTAuthentication()
+    token = verifier.get_validated_token(raw_token)
+    user = verifier.get_user(token)
+    player = Player.objects.filter(user=user).first()
+    token_cache.set(raw_token, user, player, token)
+    return user, player, token
+
+async def averify_token(raw_token, run=sync_to_async):
+    """
+    verify_token for async code, touching no thread on a cache hit. run wraps
+    verify_token for a miss, which queries the database.
+    """
+    cached = token_cache.get(raw_token)
+    if cached is not None:
+        return cached
+    return await run(verify_token)(raw_token)
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """ simplejwt's JWTAuthentication through the token cache, timed for the metrics endpoint """
+
+    def authenticate(self, request):
+        with timed(AUTH_SECONDS):
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            user, player, token = verify_token(raw_token)
+            request.player = player
+            return user, token
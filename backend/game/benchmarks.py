@@ -0,0 +1,120 @@
+"""
+Micro-benchmarks for the gameplay hot paths, timed with timeit.
+
+Each benchmark is a setup function returning the zero-argument call to time.
+Times are the best of several repeats, in nanoseconds per call, so they can be
+saved as a JSON baseline and compared after a change to the engine.
+"""
+
+import json
+import platform
+import random
+import timeit
+
+from .gameplay import CARDS, CardShoe, Gameplay
+from .models import Game
+from .replay import replay
+from .serializers import GameSerializer
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def cards(*ranks):
+    """ Card dicts for the given ranks, suits cycling """
+    suits = [suit for _, suit in CARDS[:4]]
+    return [{'rank': rank, 'suit': suits[i % 4]} for i, rank in enumerate(ranks)]
+
+@benchmark('create_deck')
+def bench_create_deck():
+    return Gameplay.create_deck
+
+@benchmark('create_shoe[6 decks]')
+def bench_create_shoe():
+    return lambda: Gameplay.create_shoe(6)
+
+# Hands with 0 to 4 Aces
+SCORE_HANDS = {
+    0: cards(10, 7),
+    1: cards('A', 6, 3),
+    2: cards('A', 'A', 9),
+    3: cards('A', 'A', 'A', 8),
+    4: cards('A', 'A', 'A', 'A', 5),
+}
+
+for aces, hand in SCORE_HANDS.items():
+    benchmark(f'calculate_score[{aces} aces]')(
+        lambda hand=hand: lambda: Gameplay.calculate_score(hand)
+    )
+
+@benchmark('check_game_status')
+def bench_check_game_status():
+    # Active, player bust, dealer bust and a settled comparison in turn
+    states = [
+        (cards(10, 6), cards(9, 7), False),
+        (cards(10, 6, 8), cards(9, 7), False),
+        (cards(10, 8), cards(9, 7, 10), True),
+        (cards('A', 8), cards(10, 'K'), True),
+    ]
+    return lambda: [Gameplay.check_game_status(*state) for state in states]
+
+@benchmark('play_dealer_hand')
+def bench_play_dealer_hand():
+    shoe = Gameplay.create_shoe(6, seed=0)
+    rng = random.Random(0)
+
+    def play():
+        deck = CardShoe(shoe, rng.randrange(len(shoe) - 20))
+        return Gameplay.play_dealer_hand(deck, [deck.pop(), deck.pop()])
+    return play
+
+@benchmark('replay')
+def bench_replay():
+    # A hit then a stand from fixed points of one seeded shoe
+    logs = [f'D6.{position} H{position + 4} S{position + 5}' for position in range(0, 200, 10)]
+    return lambda: [replay(0, log) for log in logs]
+
+@benchmark('GameSerializer')
+def bench_game_serializer():
+    game = Game(
+        id=1, player_id=1, status='ACTIVE', bet=10,
+        player_cards=cards(10, 6, 'A'), dealer_cards=cards(9, 7),
+        player_score=17, dealer_score=16,
+    )
+    return lambda: GameSerializer(game).data
+
+def run(names=None, repeat=7):
+    """ Best time per call of each benchmark, in nanoseconds """
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+
+        timer = timeit.Timer(setup())
+        number, _ = timer.autorange()
+        results[name] = min(timer.repeat(repeat, number)) / number * 1e9
+
+    return results
+
+def save(results, path):
+    with open(path, 'w') as file:
+        json.dump({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, file, indent=2)
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)['results']
+
+def compare(results, baseline, threshold):
+    """ (name, baseline ns, current ns, ratio, regressed) for benchmarks in both """
+    return [
+        (name, baseline[name], time, time / baseline[name], time / baseline[name] > 1 + threshold)
+        for name, time in results.items() if name in baseline
+    ]
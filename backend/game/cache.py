@@ -0,0 +1,148 @@
+"""
+Read-through cache for per-player profile and game state.
+
+The backend is picked by settings.BLACKJACK_STATE_CACHE: LRUCache keeps entries
+in process memory, DjangoCache stores them in one of settings.CACHES so every
+worker shares them. Writers update or drop entries once their transaction
+commits, so a cached entry never shows uncommitted state.
+
+Writes only reach the cache of the process that made them. With LRUCache and
+several workers, another worker can serve an entry up to its ttl seconds old,
+so run DjangoCache when more than one process serves requests.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+class LRUCache:
+    """
+    Bounded in-process cache that evicts the least recently used entry, and
+    any entry set more than ttl seconds ago
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class DjangoCache:
+    """ Stores entries in one of the caches configured in settings.CACHES """
+
+    def __init__(self, alias='default', timeout=300):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+class StateCache:
+    """ Counts hits and misses around a cache backend """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, load):
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = load()
+        self.backend.set(key, value)
+        return value
+
+    async def aget_or_load(self, key, load):
+        """ Like get_or_load, awaiting the load coroutine on a miss """
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = await load()
+        self.backend.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def set_on_commit(self, key, value):
+        transaction.on_commit(lambda: self.backend.set(key, value))
+
+    def delete_on_commit(self, key):
+        transaction.on_commit(lambda: self.backend.delete(key))
+
+    def delete_many_on_commit(self, keys):
+        def delete():
+            for key in keys:
+                self.backend.delete(key)
+        transaction.on_commit(delete)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+def profile_key(user_id):
+    return f'blackjack:profile:{user_id}'
+
+def game_key(user_id, game_id):
+    return f'blackjack:game:{user_id}:{game_id}'
+
+@lru_cache(maxsize=None)
+def get_state_cache():
+    config = settings.BLACKJACK_STATE_CACHE
+    backend = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return StateCache(backend)
@@ -0,0 +1,11 @@
+from django.conf import settings
+
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    """ Applies settings.BLACKJACK_SQLITE_PRAGMAS to each new SQLite connection """
+
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in settings.BLACKJACK_SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
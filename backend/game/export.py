@@ -0,0 +1,139 @@
+"""
+Streams a player's games and balance history as NDJSON or CSV.
+
+Rows are read with QuerySet.iterator in chunks and written out as they come,
+so an export holds about one chunk in memory however long the history is,
+under WSGI or ASGI alike, see ExportResponse.
+Games include archived ones, oldest first. The shoe seed and replay log are
+left out, since an active game's seed gives away the cards still to come.
+Balance changes still in the history buffer appear once it flushes.
+"""
+
+import csv
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .gameplay import Gameplay
+from .models import ArchivedGame, BalanceHistory, Game
+
+CHUNK_SIZE = 2000
+# Lines joined into each piece of the response
+LINES_PER_WRITE = 500
+
+OUTPUTS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+RECORDS = ('all', 'games', 'history')
+
+GAME_COLUMNS = (
+    'id', 'status', 'bet', 'player_cards', 'dealer_cards', 'player_score',
+    'dealer_score', 'session', 'created_at', 'finished_at',
+)
+HISTORY_COLUMNS = ('id', 'game_number', 'balance', 'timestamp')
+
+def game_rows(user):
+    """ The user's games as dicts of GAME_COLUMNS, archived games first """
+    archived = ArchivedGame.objects.filter(player=user).order_by('id').values_list(*GAME_COLUMNS)
+    for row in archived.iterator(chunk_size=CHUNK_SIZE):
+        game = dict(zip(GAME_COLUMNS, row))
+        game['player_cards'] = [Gameplay.decode_card(code) for code in game['player_cards']]
+        game['dealer_cards'] = [Gameplay.decode_card(code) for code in game['dealer_cards']]
+        yield game
+
+    games = Game.objects.filter(player=user).order_by('id').values_list(
+        *GAME_COLUMNS[:-1], 'updated_at'
+    )
+    for row in games.iterator(chunk_size=CHUNK_SIZE):
+        game = dict(zip(GAME_COLUMNS, row))
+        if game['status'] == 'ACTIVE':
+            game['finished_at'] = None
+        yield game
+
+def history_rows(user):
+    rows = BalanceHistory.objects.filter(player__user=user).order_by('id').values_list(
+        *HISTORY_COLUMNS
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(HISTORY_COLUMNS, row))
+
+def ndjson_lines(user, records):
+    """ One JSON object per line, its record field telling games from history """
+    encoder = DjangoJSONEncoder()
+    if records in ('all', 'games'):
+        for game in game_rows(user):
+            yield encoder.encode({'record': 'game', **game}) + '\n'
+    if records in ('all', 'history'):
+        for entry in history_rows(user):
+            yield encoder.encode({'record': 'history', **entry}) + '\n'
+
+class Echo:
+    """ File-like object that hands back what csv.writer writes to it """
+
+    def write(self, value):
+        return value
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        # Cards as short labels, e.g. "10H QS"
+        return ' '.join(f"{card['rank']}{card['suit'][0]}" for card in value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def csv_lines(user, records):
+    writer = csv.writer(Echo())
+    if records == 'games':
+        columns, rows = GAME_COLUMNS, game_rows(user)
+    else:
+        columns, rows = HISTORY_COLUMNS, history_rows(user)
+
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([csv_value(row[column]) for column in columns])
+
+def export_lines(user, output='ndjson', records='all'):
+    """
+    The export as an iterator of text pieces. Raises ValueError for an unknown
+    output or records, or CSV of both records, which have different columns.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f'Output must be one of: {", ".join(OUTPUTS)}')
+    if records not in RECORDS:
+        raise ValueError(f'Records must be one of: {", ".join(RECORDS)}')
+    if output == 'csv' and records == 'all':
+        raise ValueError('CSV exports one kind of record at a time, games or history')
+
+    lines = ndjson_lines(user, records) if output == 'ndjson' else csv_lines(user, records)
+    return batched(lines)
+
+def batched(lines):
+    """ Joins lines into fewer, larger pieces for the response to write """
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == LINES_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+class ExportResponse(StreamingHttpResponse):
+    """
+    Streams export_lines under either server. Under ASGI, StreamingHttpResponse
+    would read a sync iterator into a list before sending anything, so each
+    piece is pulled through sync_to_async instead, one at a time.
+    """
+
+    async def __aiter__(self):
+        # The handler's close() stops the generator, in the thread it ran in
+        pieces = iter(self.streaming_content)
+        while True:
+            piece = await sync_to_async(next)(pieces, None)
+            if piece is None:
+                return
+            yield piece
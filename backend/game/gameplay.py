@@ -1,14 +1,112 @@
 import random
 
+RANKS = [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A']
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+
+# Cards are encoded as small integers (rank index * 4 + suit index), so a
+# code fits in one byte and indexes straight into the lookup tables below
+CARDS = tuple((rank, suit) for rank in RANKS for suit in SUITS)
+CARD_CODES = {card: code for code, card in enumerate(CARDS)}
+
+# Hard value of each card code, Aces count as 1
+CARD_VALUES = bytes(1 if rank == 'A' else 10 if rank in ('J', 'Q', 'K') else rank
+                    for rank, _ in CARDS)
+
+class Hand:
+    """ A hand of encoded cards with a running hard total and an Ace flag """
+
+    __slots__ = ('codes', 'hard', 'has_ace')
+
+    def __init__(self, codes=()):
+        self.codes = bytearray()
+        self.hard = 0
+        self.has_ace = False
+
+        for code in codes:
+            self.add(code)
+
+    @classmethod
+    def from_cards(cls, cards):
+        return cls(Gameplay.encode_card(card) for card in cards)
+
+    def add(self, code):
+        value = CARD_VALUES[code]
+        self.codes.append(code)
+        self.hard += value
+        self.has_ace = self.has_ace or value == 1
+
+    def add_card(self, card):
+        self.add(Gameplay.encode_card(card))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def is_soft(self):
+        # One Ace can count as 11 without busting
+        return self.has_ace and self.hard <= 11
+
+    @property
+    def score(self):
+        return self.hard + 10 if self.is_soft else self.hard
+
+    @property
+    def is_blackjack(self):
+        return len(self.codes) == 2 and self.score == 21
+
+    def to_cards(self):
+        return [Gameplay.decode_card(code) for code in self.codes]
+
+class CardShoe:
+    """ Deals encoded cards from a shuffled shoe in order, like a deck list """
+
+    __slots__ = ('cards', 'position')
+
+    def __init__(self, cards, position=0):
+        self.cards = cards
+        self.position = position
+
+    def __len__(self):
+        return len(self.cards) - self.position
+
+    def pop(self):
+        if self.position >= len(self.cards):
+            raise IndexError("pop from empty shoe")
+
+        code = self.cards[self.position]
+        self.position += 1
+
+        return Gameplay.decode_card(code)
+
 class Gameplay:
     @staticmethod
-    def create_deck(num_decks=1):
-        ranks = [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A']
-        suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-        deck = [{'rank': rank, 'suit': suit} for rank in ranks for suit in suits] * num_decks
-        random.shuffle(deck)
+    def create_deck(num_decks=1, seed=None):
+        deck = [Gameplay.decode_card(code) for code in range(len(CARDS))] * num_decks
+        Gameplay.rng(seed).shuffle(deck)
 
         return deck
+
+    @staticmethod
+    def create_shoe(num_decks=1, seed=None):
+        codes = bytearray(range(len(CARDS))) * num_decks
+        Gameplay.rng(seed).shuffle(codes)
+
+        return bytes(codes)
+
+    @staticmethod
+    def rng(seed=None):
+        # A generator of its own for a recorded seed, so the same seed always
+        # gives the same order, else the module's shared one
+        return random if seed is None else random.Random(seed)
+
+    @staticmethod
+    def encode_card(card):
+        return CARD_CODES[(card['rank'], card['suit'])]
+
+    @staticmethod
+    def decode_card(code):
+        rank, suit = CARDS[code]
+        return {'rank': rank, 'suit': suit}
     
     @staticmethod
     def get_card_value(card):
@@ -22,37 +120,26 @@ class Gameplay:
         
     @staticmethod
     def calculate_score(cards):
-        if not cards:
-            return 0
-            
-        # Get all possible scores considering Aces
-        possible_scores = [0]
-        for card in cards:
-            card_values = Gameplay.get_card_value(card)
-            new_scores = []
-            
-            for value in card_values:
-                for score in possible_scores:
-                    new_scores.append(score + value)
-                    
-            possible_scores = new_scores
-
-        # Get best score that doesn't bust
-        valid_scores = [s for s in possible_scores if s <= 21]
-        if valid_scores:
-            return max(valid_scores)
-        
-        # If all scores bust, return lowest bust score
-        return min(possible_scores)
+        # At most one Ace can count as 11, so the best score that doesn't bust
+        # is the hard total plus 10 when that still fits, else the hard total
+        return Hand.from_cards(cards).score
     
     @staticmethod
     def check_game_status(player_cards, dealer_cards, is_dealer_turn_complete):
-        player_score = Gameplay.calculate_score(player_cards)
-        dealer_score = Gameplay.calculate_score(dealer_cards)
+        return Gameplay.check_hand_status(
+            Hand.from_cards(player_cards),
+            Hand.from_cards(dealer_cards),
+            is_dealer_turn_complete
+        )
+
+    @staticmethod
+    def check_hand_status(player_hand, dealer_hand, is_dealer_turn_complete):
+        player_score = player_hand.score
+        dealer_score = dealer_hand.score
 
         # Check for blackjack
-        player_blackjack = Gameplay.is_blackjack(player_cards)
-        dealer_blackjack = Gameplay.is_blackjack(dealer_cards)
+        player_blackjack = player_hand.is_blackjack
+        dealer_blackjack = dealer_hand.is_blackjack
 
         if player_blackjack and dealer_blackjack:
             return 'TIE'
@@ -78,7 +165,7 @@ class Gameplay:
     
     @staticmethod
     def is_blackjack(cards):
-        return len(cards) == 2 and Gameplay.calculate_score(cards) == 21
+        return Hand.from_cards(cards).is_blackjack
     
     @staticmethod
     def deal_initial_cards(deck):
@@ -90,6 +177,19 @@ class Gameplay:
 
         return player_cards, dealer_cards, deck
 
+    @staticmethod
+    def deal_spots(deck, spots):
+        """ Deals a card to each spot then the dealer, twice round, as at a multi-spot table """
+        if len(deck) < 2 * (spots + 1):
+            raise ValueError("Not enough cards in the deck to deal initial hands.")
+
+        hands = [[] for _ in range(spots + 1)]
+        for _ in range(2):
+            for cards in hands:
+                cards.append(deck.pop())
+
+        return hands[:-1], hands[-1], deck
+
     @staticmethod
     def hit(deck, cards):
         if not deck:
@@ -101,9 +201,13 @@ class Gameplay:
         return deck, cards, new_card
     
     @staticmethod
-    def play_dealer_hand(deck, dealer_cards):
-        while Gameplay.calculate_score(dealer_cards) < 17 and deck:
-            deck, dealer_cards, _ = Gameplay.hit(deck, dealer_cards)
+    def play_dealer_hand(deck, dealer_cards, dealer_hand=None):
+        if dealer_hand is None:
+            dealer_hand = Hand.from_cards(dealer_cards)
+
+        while dealer_hand.score < 17 and deck:
+            deck, dealer_cards, new_card = Gameplay.hit(deck, dealer_cards)
+            dealer_hand.add_card(new_card)
             
         return deck, dealer_cards
     
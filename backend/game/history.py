@@ -0,0 +1,289 @@
+"""
+Write-behind buffer for BalanceHistory rows.
+
+Settlement hands its rows to the buffer once its transaction commits, and the
+buffer inserts them with one bulk_create when it holds MAX_ROWS rows or its
+oldest row is MAX_DELAY seconds old, whichever comes first.
+
+With LOG_PATH set, rows are also appended to a per-process log before their
+transaction commits, so a crash straight after the commit loses none. A flush
+drops the rows it inserted from the log and carries over those still waiting
+on their transaction, up to PENDING_SECONDS old, after which their transaction
+is taken as rolled back. Logs left behind by a process that died are replayed
+once at startup, from GameConfig.ready, by one process at a time. A replayed
+row whose game number the player hasn't reached belongs to a settlement that
+rolled back, and is skipped. Every row carries a unique key, and a player has
+one row per game number, so replaying rows that did reach the database is
+harmless.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+
+from .models import BalanceHistory, Player
+
+logger = logging.getLogger(__name__)
+
+# How long a logged row may wait on its transaction before it's taken as rolled back
+PENDING_SECONDS = 60
+
+class HistoryBuffer:
+    """ Batches BalanceHistory rows into bulk inserts """
+
+    def __init__(self, max_rows=500, max_delay=2.0, log_path=None):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        # Each process keeps its own log, named after LOG_PATH and its pid
+        self.log_base = Path(log_path) if log_path else None
+        self.log_path = self.log_base.with_name(f'{self.log_base.name}.{os.getpid()}') if log_path else None
+        if log_path:
+            set_aside(self.log_base)
+        self.rows = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.timer = None
+        self.inserts = 0
+        self.rows_written = 0
+
+    def log(self, rows):
+        """ Appends rows to the log, before the transaction writing them commits """
+        if not self.log_path:
+            return
+
+        with self.lock:
+            append_log(self.log_path, [encode(row) for row in rows])
+
+    def add(self, rows):
+        """ Buffers rows whose transaction committed, inserting them now if the buffer is full """
+        with self.lock:
+            self.rows.extend(rows)
+            full = len(self.rows) >= self.max_rows
+            if not full and self.timer is None:
+                self.timer = threading.Timer(self.max_delay, self.flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """ Inserts every buffered row, then drops the log they were kept in """
+        with self.flush_lock:
+            with self.lock:
+                rows, self.rows = self.rows, []
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+
+                # Rows added from here on go to a fresh log
+                flushing = None
+                if self.log_path and self.log_path.exists():
+                    flushing = self.log_path.with_name(self.log_path.name + '.flushing')
+                    os.replace(self.log_path, flushing)
+
+            try:
+                if rows:
+                    insert(rows)
+            except Exception:
+                self.restore(rows, flushing)
+                raise
+
+            if rows:
+                self.inserts += 1
+                self.rows_written += len(rows)
+
+            if flushing:
+                self.carry_over(flushing, {str(row.key) for row in rows})
+
+    def carry_over(self, flushing, inserted):
+        """ Moves the entries of a flushed log still waiting on their transaction to the current log """
+        cutoff = time.time() - PENDING_SECONDS
+        pending = [
+            values for values in read_log(flushing)
+            if values[0] not in inserted and datetime.fromisoformat(values[4]).timestamp() > cutoff
+        ]
+
+        with self.lock:
+            if pending:
+                append_log(self.log_path, pending)
+            flushing.unlink(missing_ok=True)
+
+    def restore(self, rows, flushing):
+        """ Puts rows that failed to insert back ahead of the ones added since """
+        with self.lock:
+            self.rows[:0] = rows
+            if flushing:
+                if self.log_path.exists():
+                    with open(flushing, 'ab') as log:
+                        log.write(self.log_path.read_bytes())
+                os.replace(flushing, self.log_path)
+
+    def flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def stats(self):
+        return {
+            'buffered': len(self.rows),
+            'inserts': self.inserts,
+            'rows_written': self.rows_written,
+        }
+
+def replay(log_base):
+    """
+    Inserts the committed rows in logs left by processes that are no longer
+    running, holding a lock so no other process replays them at the same time.
+    Returns how many rows it inserted or found already inserted.
+    """
+    log_base = Path(log_base)
+    replayed = 0
+
+    with open(log_base.with_name(f'{log_base.name}.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        for path in sorted(log_base.parent.glob(f'{log_base.name}.*')):
+            pid = path.name[len(log_base.name) + 1:].split('.')[0]
+            if not pid.isdigit():
+                continue
+            if not path.name.endswith('.stale') and is_running(int(pid)):
+                continue
+
+            rows = committed([decode(values) for values in read_log(path)])
+            if rows:
+                insert(rows)
+            path.unlink(missing_ok=True)
+            replayed += len(rows)
+
+    return replayed
+
+def set_aside(log_base):
+    """
+    Renames logs under this process's pid, left by an earlier process given
+    the same pid, so replay takes them for a dead process's
+    """
+    log_path = log_base.with_name(f'{log_base.name}.{os.getpid()}')
+    for path in (log_path, log_path.with_name(log_path.name + '.flushing')):
+        if path.exists():
+            os.replace(path, path.with_name(f'{path.name}.{time.time_ns()}.stale'))
+
+def replay_in_background():
+    """ Sets aside this pid's old logs, then replays left-behind logs from a thread """
+    log_base = (settings.BLACKJACK_HISTORY_BUFFER or {}).get('LOG_PATH')
+    if not log_base:
+        return None
+    set_aside(Path(log_base))
+
+    def run():
+        try:
+            replayed = replay(log_base)
+        except DatabaseError:
+            # Such as before migrating, the logs are kept for the next start
+            logger.warning("Couldn't replay balance history logs", exc_info=True)
+        else:
+            if replayed:
+                logger.info("Replayed %d balance history rows", replayed)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='history-replay', daemon=True)
+    thread.start()
+    return thread
+
+def insert(rows):
+    BalanceHistory.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+def committed(rows):
+    """ Rows whose game number the player has reached, and those with no game number """
+    games_played = dict(
+        Player.objects.filter(pk__in={row.player_id for row in rows})
+        .values_list('pk', 'games_played')
+    )
+    return [
+        row for row in rows
+        if row.game_number is None or row.game_number <= games_played.get(row.player_id, 0)
+    ]
+
+def append_log(path, entries):
+    with open(path, 'a') as log:
+        log.writelines(json.dumps(values) + '\n' for values in entries)
+        log.flush()
+        os.fsync(log.fileno())
+
+def read_log(path):
+    """ The entries of a log, if it still exists """
+    entries = []
+    try:
+        with open(path) as log:
+            for line in log:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A crash mid-write can leave the last line incomplete
+                    break
+    except FileNotFoundError:
+        pass
+    return entries
+
+def encode(row):
+    return [str(row.key), row.player_id, row.balance, row.game_number, row.timestamp.isoformat()]
+
+def decode(values):
+    if len(values) == 4:
+        # Logged before rows had keys
+        values = [None, *values]
+    key, player_id, balance, game_number, timestamp = values
+    return BalanceHistory(
+        key=uuid.UUID(key) if key else None,
+        player_id=player_id,
+        balance=balance,
+        game_number=game_number,
+        timestamp=datetime.fromisoformat(timestamp)
+    )
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@lru_cache(maxsize=None)
+def get_history_buffer():
+    """ The process's buffer, or None when settings.BLACKJACK_HISTORY_BUFFER is None """
+    config = settings.BLACKJACK_HISTORY_BUFFER
+    if config is None:
+        return None
+
+    buffer = HistoryBuffer(
+        max_rows=config.get('MAX_ROWS', 500),
+        max_delay=config.get('MAX_DELAY', 2.0),
+        log_path=config.get('LOG_PATH'),
+    )
+    atexit.register(buffer.flush)
+    return buffer
+
+def record_history(rows):
+    """ Writes history rows once the current transaction commits, through the buffer if there is one """
+    buffer = get_history_buffer()
+    if buffer is None:
+        BalanceHistory.objects.bulk_create(rows)
+    else:
+        buffer.log(rows)
+        transaction.on_commit(lambda: buffer.add(rows))
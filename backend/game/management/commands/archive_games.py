@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from game.archive import archive_games, reclaim_space, strip_decks
+
+class Command(BaseCommand):
+    help = (
+        "Empties the leftover deck of finished games and moves old finished games "
+        "to the archive table or a gzipped JSON lines file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.BLACKJACK_ARCHIVE_AFTER_DAYS,
+                            help="Archive finished games last updated more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--file', default=None,
+                            help="Append archived games to this .jsonl.gz file instead of the archive table")
+        parser.add_argument('--strip-only', action='store_true',
+                            help="Only empty the decks, keeping every game in place")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="Reclaim the freed space afterwards (SQLite VACUUM, PostgreSQL VACUUM ANALYZE)")
+        parser.add_argument('--every', type=int, default=None,
+                            help="Keep running, repeating every this many seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if options['every'] is None:
+                return
+
+            close_old_connections()
+            time.sleep(options['every'])
+
+    def run_once(self, options):
+        stripped = strip_decks(options['batch_size'])
+        self.stdout.write(f"Emptied the deck of {stripped} finished games")
+
+        if not options['strip_only']:
+            before = timezone.now() - timedelta(days=options['days'])
+            moved = archive_games(before, options['batch_size'], options['file'])
+            self.stdout.write(
+                f"Archived {moved} games finished before {before:%Y-%m-%d %H:%M} "
+                f"to {options['file'] or 'the archive table'}"
+            )
+
+        if options['vacuum']:
+            if reclaim_space():
+                self.stdout.write("Reclaimed the freed space")
+            else:
+                self.stdout.write("This database has no VACUUM, space not reclaimed")
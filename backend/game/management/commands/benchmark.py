@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from game.benchmarks import BENCHMARKS, compare, load, run, save
+
+class Command(BaseCommand):
+    help = (
+        "Times the gameplay hot paths, optionally saving them as a JSON baseline "
+        "or comparing them against one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help=f"Benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+        parser.add_argument('--repeat', type=int, default=7,
+                            help="Timing runs per benchmark, the best is kept")
+        parser.add_argument('--save', metavar='PATH', help="Write the results as a baseline")
+        parser.add_argument('--compare', metavar='PATH', help="Compare against a saved baseline")
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help="Slowdown over the baseline flagged as a regression, 0.10 being 10%%")
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        results = run(options['names'], options['repeat'])
+
+        if options['compare']:
+            rows = compare(results, load(options['compare']), options['threshold'])
+            self.stdout.write(f"{'benchmark':<28}{'baseline ns':>14}{'current ns':>14}{'change':>9}")
+            for name, before, after, ratio, regressed in rows:
+                self.stdout.write(
+                    f"{name:<28}{before:>14.1f}{after:>14.1f}{ratio - 1:>+9.1%}"
+                    f"{'  REGRESSION' if regressed else ''}"
+                )
+        else:
+            self.stdout.write(f"{'benchmark':<28}{'ns/call':>14}")
+            for name, time in results.items():
+                self.stdout.write(f"{name:<28}{time:>14.1f}")
+
+        if options['save']:
+            save(results, options['save'])
+            self.stdout.write(f"Saved the results to {options['save']}")
+
+        if options['compare'] and any(regressed for *_, regressed in rows):
+            raise CommandError(f"Slower than the baseline by more than {options['threshold']:.0%}")
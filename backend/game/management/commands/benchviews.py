@@ -0,0 +1,117 @@
+import asyncio
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from game.models import Player
+
+class Command(BaseCommand):
+    help = (
+        "Plays the same hands through the sync (/api/games/) and async (/api/async/games/) "
+        "endpoints in-process, with temporary players in the configured database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=20,
+                            help="Players playing at once, one thread or task each")
+        parser.add_argument('--hands', type=int, default=20, help="Hands per player")
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        users = [
+            User.objects.create_user(username=f'{prefix}-{i}')
+            for i in range(options['players'])
+        ]
+        Player.objects.bulk_create([Player(user=user, balance=10 ** 9) for user in users])
+        headers = [
+            {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+            for user in users
+        ]
+
+        # Lets the test clients through ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            self.report('sync', *self.run_sync(headers, options['hands']))
+            self.report('async', *asyncio.run(self.run_async(headers, options['hands'])))
+        finally:
+            teardown_test_environment()
+            User.objects.filter(username__startswith=prefix).delete()
+
+    def run_sync(self, headers, hands):
+        def play(player_headers):
+            client = Client(headers=player_headers)
+            latencies, errors = [], 0
+            try:
+                for _ in range(hands):
+                    errors += self.play_hand(client.post, '/api/games/', latencies)
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(headers)) as executor:
+            results = list(executor.map(play, headers))
+        return results, len(headers) * hands, time.perf_counter() - start
+
+    async def run_async(self, headers, hands):
+        async def play(player_headers):
+            client = AsyncClient()
+            latencies, errors = [], 0
+
+            async def post(path, data=None, **kwargs):
+                return await client.post(path, data, headers=player_headers, **kwargs)
+
+            for _ in range(hands):
+                errors += await self.aplay_hand(post, '/api/async/games/', latencies)
+            return latencies, errors
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(play(player_headers) for player_headers in headers))
+        return results, len(headers) * hands, time.perf_counter() - start
+
+    def play_hand(self, post, base, latencies):
+        """ Plays one hand, hitting below 17, and returns 1 if any request failed """
+        def timed(path, data=None):
+            start = time.perf_counter()
+            response = post(path, data, content_type='application/json')
+            latencies.append(time.perf_counter() - start)
+            return response
+
+        response = timed(base, {'bet': 1})
+        while response.status_code < 300 and response.json()['status'] == 'ACTIVE':
+            game = response.json()
+            action = 'hit' if game['player_score'] < 17 else 'stand'
+            response = timed(f"{base}{game['id']}/{action}/")
+        return int(response.status_code >= 300)
+
+    async def aplay_hand(self, post, base, latencies):
+        async def timed(path, data=None):
+            start = time.perf_counter()
+            response = await post(path, data, content_type='application/json')
+            latencies.append(time.perf_counter() - start)
+            return response
+
+        response = await timed(base, {'bet': 1})
+        while response.status_code < 300 and response.json()['status'] == 'ACTIVE':
+            game = response.json()
+            action = 'hit' if game['player_score'] < 17 else 'stand'
+            response = await timed(f"{base}{game['id']}/{action}/")
+        return int(response.status_code >= 300)
+
+    def report(self, label, results, hands, elapsed):
+        latencies = sorted(latency for player_latencies, _ in results for latency in player_latencies)
+        errors = sum(player_errors for _, player_errors in results)
+        cuts = statistics.quantiles(latencies, n=100)
+
+        self.stdout.write(
+            f"{label:>5}: {hands / elapsed:8.1f} hands/s, {len(latencies) / elapsed:8.1f} requests/s, "
+            f"p50 {cuts[49] * 1000:6.1f} ms, p95 {cuts[94] * 1000:6.1f} ms, {errors} failed hands"
+        )
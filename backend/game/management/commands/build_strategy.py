@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from game.strategy import TABLE_PATH, write_table
+
+class Command(BaseCommand):
+    help = "Rebuilds the basic-strategy and expected value table served by the hint endpoint"
+
+    def handle(self, *args, **options):
+        table = write_table(TABLE_PATH)
+        self.stdout.write(f"Wrote {len(table) // 2} table entries to {TABLE_PATH}")
@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from game.export import OUTPUTS, RECORDS, export_lines
+
+class Command(BaseCommand):
+    help = "Streams a player's games and balance history as NDJSON or CSV, in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', choices=OUTPUTS, default='ndjson')
+        parser.add_argument('--records', choices=RECORDS, default='all',
+                            help="CSV takes games or history, which have different columns")
+        parser.add_argument('--file', default=None, help="Write here instead of standard output")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"No player {options['username']}")
+
+        try:
+            pieces = export_lines(user, options['output'], options['records'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['file'] is None:
+            for piece in pieces:
+                self.stdout.write(piece, ending='')
+            return
+
+        with open(options['file'], 'w', newline='') as file:
+            for piece in pieces:
+                file.write(piece)
@@ -0,0 +1,149 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1', '')
+
+class Client:
+    """ One simulated player's keep-alive connection to the API """
+
+    def __init__(self, url, stats):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        self.prefix = parts.path.rstrip('/')
+        self.stats = stats
+        self.token = None
+
+    def request(self, endpoint, method, path, data=None):
+        """ Sends a request, timing it under endpoint, and returns (status, JSON body) """
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        body = json.dumps(data) if data is not None else None
+
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, self.prefix + path, body, headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            # Dropped connections count as errors, and the next request reconnects
+            self.connection.close()
+            payload, status = b'', 0
+        self.stats.record(endpoint, time.perf_counter() - start, status)
+
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+class Stats:
+    """ Latencies and error counts per endpoint, shared by every worker thread """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, latency, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            if not 200 <= status < 300:
+                self.errors[endpoint][status] += 1
+
+class Command(BaseCommand):
+    help = (
+        "Registers simulated players against a running local server and plays "
+        "create/hit/stand loops through /api/, reporting latency, throughput and errors per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api',
+                            help="Base URL of the API, which must be served from this machine")
+        parser.add_argument('--users', type=int, default=1000, help="Players to register")
+        parser.add_argument('--hands', type=int, default=10, help="Hands each player plays")
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help="Players active at once, one thread each")
+        parser.add_argument('--bet', type=int, default=10)
+        parser.add_argument('--stand-on', type=int, default=17,
+                            help="Players hit until their score reaches this")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="Delete the registered players afterwards, through this project's database")
+
+    def handle(self, *args, **options):
+        if urlsplit(options['url']).hostname not in LOCAL_HOSTS:
+            raise CommandError("Load tests only run against a server on this machine")
+
+        database = settings.DATABASES['default']
+        if database['ENGINE'].endswith('postgresql') and database.get('HOST') not in LOCAL_HOSTS + (None,):
+            raise CommandError("Load tests only run against a local stand-in database")
+
+        prefix = f'load-{uuid.uuid4().hex[:8]}'
+        stats = Stats()
+
+        def play(number):
+            client = Client(options['url'], stats)
+            status, body = client.request('register', 'POST', '/register/', {
+                'username': f'{prefix}-{number}', 'password': prefix,
+            })
+            if status != 200:
+                return
+            client.token = body['access']
+
+            for _ in range(options['hands']):
+                self.play_hand(client, options['bet'], options['stand_on'])
+            client.request('profile', 'GET', '/profile/')
+            client.connection.close()
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                list(executor.map(play, range(options['users'])))
+        finally:
+            elapsed = time.perf_counter() - start
+            self.report(stats, elapsed)
+
+            if options['cleanup']:
+                deleted, _ = User.objects.filter(username__startswith=f'{prefix}-').delete()
+                self.stdout.write(f"Deleted {deleted} rows for the {prefix} players")
+
+    def play_hand(self, client, bet, stand_on):
+        status, game = client.request('create', 'POST', '/games/', {'bet': bet})
+        while status in (200, 201) and game['status'] == 'ACTIVE':
+            if game['player_score'] < stand_on:
+                status, game = client.request('hit', 'POST', f"/games/{game['id']}/hit/")
+            else:
+                status, game = client.request('stand', 'POST', f"/games/{game['id']}/stand/")
+
+    def report(self, stats, elapsed):
+        total = sum(len(latencies) for latencies in stats.latencies.values())
+        self.stdout.write(
+            f"{total} requests in {elapsed:.1f} s, {total / elapsed:.1f} requests/s\n"
+            f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'error %':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}  error statuses"
+        )
+
+        for endpoint, latencies in stats.latencies.items():
+            # quantiles needs two points, a lone request is every percentile
+            cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            errors = sum(stats.errors[endpoint].values())
+            # Status 0 means the connection failed
+            statuses = ', '.join(
+                f'{status} x{count}' for status, count in sorted(stats.errors[endpoint].items())
+            )
+            self.stdout.write(
+                f"{endpoint:<10}{len(latencies):>10}{errors:>8}{errors / len(latencies):>9.2%}"
+                f"{cuts[49] * 1000:>9.1f}{cuts[94] * 1000:>9.1f}{cuts[98] * 1000:>9.1f}"
+                f"{len(latencies) / elapsed:>9.1f}  {statuses}"
+            )
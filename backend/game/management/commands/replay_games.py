@@ -0,0 +1,97 @@
+import gzip
+import json
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.gameplay import CARDS
+from game.models import ArchivedGame, Game
+from game.replay import replay, replay_all, verify
+
+REPLAY_FIELDS = ('id', 'seed', 'log', 'bet', 'status', 'player_cards', 'dealer_cards',
+                 'player_score', 'dealer_score')
+
+def format_hand(hand):
+    cards = ' '.join(f'{rank}{suit[0]}' for rank, suit in (CARDS[code] for code in hand.codes))
+    return f'{cards} ({hand.score})'
+
+class Command(BaseCommand):
+    help = (
+        "Replays logged games from their shoe seeds, checking them against the "
+        "recorded cards and results, from the database or an archive file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', type=int, default=None,
+                            help="Re-derive this one game, live or archived, and check it against its record")
+        parser.add_argument('--file', default=None,
+                            help="Replay the games of a .jsonl.gz file written by archive_games")
+        parser.add_argument('--no-verify', action='store_true',
+                            help="Only time the replays, without comparing them to the records")
+        parser.add_argument('--repeat', type=int, default=1,
+                            help="Replay the loaded games this many times, for throughput")
+
+    def handle(self, *args, **options):
+        if options['game'] is not None:
+            return self.show_game(options['game'])
+
+        games = self.read_file(options['file']) if options['file'] else self.read_database()
+        if not games:
+            raise CommandError("No logged games to replay")
+
+        if not options['no_verify']:
+            mismatched = [(game.id, fields) for game in games if (fields := verify(game))]
+            for game_id, fields in mismatched[:20]:
+                self.stdout.write(f"Game {game_id} differs in {', '.join(fields)}")
+            self.stdout.write(f"{len(games) - len(mismatched):,} of {len(games):,} games match their replay")
+
+        records = [(game.seed, game.log, game.bet) for game in games] * options['repeat']
+        start = time.perf_counter()
+        statuses, net = replay_all(records)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Replayed {len(records):,} hands in {elapsed:.2f} s, {len(records) / elapsed:,.0f} hands/s"
+        )
+        self.stdout.write(', '.join(f"{status} {count:,}" for status, count in statuses.items()))
+        self.stdout.write(f"Player net: {net:+,}")
+
+        if not options['no_verify'] and mismatched:
+            raise CommandError(f"{len(mismatched)} games differ from their replay")
+
+    def read_database(self):
+        games = []
+        for model in (Game, ArchivedGame):
+            games.extend(
+                model.objects.filter(seed__isnull=False).exclude(log='')
+                .only(*REPLAY_FIELDS).order_by('id').iterator(chunk_size=2000)
+            )
+        return games
+
+    def read_file(self, path):
+        with gzip.open(path, 'rt') as file:
+            return [
+                SimpleNamespace(**record) for record in map(json.loads, file)
+                if record.get('seed') is not None and record.get('log')
+            ]
+
+    def show_game(self, game_id):
+        game = (Game.objects.filter(id=game_id).first()
+                or ArchivedGame.objects.filter(id=game_id).first())
+        if game is None:
+            raise CommandError(f"No game {game_id}")
+        if game.seed is None or not game.log:
+            raise CommandError(f"Game {game_id} was dealt before games were logged")
+
+        player, dealer, status = replay(game.seed, game.log)
+        self.stdout.write(f"Seed {game.seed}, log {game.log}")
+        self.stdout.write(f"Player: {format_hand(player)}")
+        self.stdout.write(f"Dealer: {format_hand(dealer)}")
+        self.stdout.write(f"Status: {status}, bet {game.bet}")
+
+        fields = verify(game)
+        if fields:
+            raise CommandError(f"The record differs in {', '.join(fields)}")
+        self.stdout.write("Matches the record")
+
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from game.rollups import rebuild_stats
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the hourly and daily player stats served by /api/profile/stats/ "
+        "from every finished game. Settlement keeps them up, so this is for games "
+        "settled before it did, or to repair them."
+    )
+
+    def handle(self, *args, **options):
+        games = rebuild_stats()
+        self.stdout.write(f"Rebuilt stats from {games} games")
@@ -0,0 +1,70 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from game.simulate import POLICIES, simulate_parallel
+
+class Command(BaseCommand):
+    help = "Simulates hands under the table rules and reports the house edge"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hands', type=int, default=1_000_000)
+        parser.add_argument('--policy', choices=sorted(POLICIES), default='mimic-dealer')
+        parser.add_argument('--decks', type=int, default=settings.BLACKJACK_SHOE_DECKS)
+        parser.add_argument('--penetration', type=float,
+                            default=settings.BLACKJACK_SHOE_PENETRATION)
+        parser.add_argument('--lanes', type=int, default=10000,
+                            help="Hands played side by side in each NumPy batch")
+        parser.add_argument('--seed', type=int, default=None,
+                            help="Master seed, a random one is picked and reported if omitted")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Worker processes, 0 uses every core")
+        parser.add_argument('--shard-size', type=int, default=250000,
+                            help="Hands per parallel shard, part of what the seed reproduces")
+
+    def handle(self, *args, **options):
+        if options['seed'] is None:
+            options['seed'] = np.random.SeedSequence().entropy
+
+        workers = options['workers'] or os.cpu_count()
+        params = dict(
+            policy=options['policy'],
+            num_decks=options['decks'],
+            penetration=options['penetration'],
+            lanes=options['lanes'],
+            seed=options['seed'],
+        )
+
+        start = time.perf_counter()
+        # Always sharded, so a seed gives the same result on any number of workers
+        result = simulate_parallel(
+            options['hands'], workers=workers, shard_size=options['shard_size'], **params
+        )
+        elapsed = time.perf_counter() - start
+
+        self.write_report(result, options, workers, elapsed)
+
+    def write_report(self, result, options, workers, elapsed):
+        self.stdout.write(
+            f"{result.hands:,} hands, policy {options['policy']}, "
+            f"{options['decks']} decks, {options['penetration']:.0%} penetration"
+        )
+        self.stdout.write(f"Seed:           {options['seed']}")
+
+        for label, count in (("Win rate", result.wins), ("Tie rate", result.ties),
+                             ("Loss rate", result.losses), ("Blackjack rate", result.blackjacks)):
+            low, high = result.rate_interval(count)
+            self.stdout.write(
+                f"{label + ':':<16}{result.rate(count):.4%} (95% CI {low:.4%} to {high:.4%})"
+            )
+
+        low, high = result.confidence_interval()
+        self.stdout.write(f"House edge:     {result.house_edge:.4%} (95% CI {low:.4%} to {high:.4%})")
+        self.stdout.write(f"Variance:       {result.variance:.4f} per hand")
+        self.stdout.write(
+            f"Elapsed:        {elapsed:.2f}s on {workers} worker(s) "
+            f"({result.hands / elapsed:,.0f} hands/s)"
+        )
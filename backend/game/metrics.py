@@ -0,0 +1,243 @@
+"""
+In-process request metrics, served in the Prometheus text format.
+
+MetricsMiddleware times every request and counts its database queries and
+their time. Queries are counted by a wrapper installed on every connection as
+it opens, which finds the request's QueryTimer through a context variable, so
+queries a request makes from sync_to_async worker threads count as well. The auth class, GameSerializer and the game services add the time
+spent verifying tokens, serializing, dealing, dealer play and settling. Each
+process keeps its own histograms, so a scrape only sees the worker it reached.
+"""
+
+import atexit
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 4, 6, 8, 12, 16, 32, 64)
+
+class Histogram:
+    """ Cumulative bucket counts, sum and count per label set """
+
+    def __init__(self, name, help, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total, count = self.series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.series[key] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{format_labels(key, le=bound)} {bucket_count}')
+                lines.append(f'{self.name}_bucket{format_labels(key, le="+Inf")} {count}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {total}')
+                lines.append(f'{self.name}_count{format_labels(key)} {count}')
+        return lines
+
+class Counter:
+    """ Monotonic count per label set """
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.series.items()):
+                lines.append(f'{self.name}{format_labels(key)} {value}')
+        return lines
+
+def format_labels(key, **extra):
+    pairs = [*key, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+REQUEST_SECONDS = Histogram('blackjack_request_seconds', 'Time to serve a request')
+REQUEST_QUERIES = Histogram(
+    'blackjack_request_db_queries', 'Database queries made by a request', QUERY_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram('blackjack_request_db_seconds', 'Time a request spent in database queries')
+RESPONSES = Counter('blackjack_responses_total', 'Responses sent, by status code')
+AUTH_SECONDS = Histogram('blackjack_auth_seconds', 'Time to authenticate a request token')
+SERIALIZER_SECONDS = Histogram('blackjack_serializer_seconds', 'Time to serialize one object')
+STEP_SECONDS = Histogram('blackjack_step_seconds', 'Time spent in each step of playing a game')
+
+METRICS = [
+    REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, RESPONSES,
+    AUTH_SECONDS, SERIALIZER_SECONDS, STEP_SECONDS,
+]
+
+@contextmanager
+def timed(histogram, **labels):
+    """ Observes the time spent in the block """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def timed_call(histogram, **labels):
+    """ Decorator form of timed """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def gauges():
+    """ Point-in-time values from the state cache and history buffer """
+    from .cache import get_state_cache
+    from .history import get_history_buffer
+
+    values = {
+        f'blackjack_state_cache_{name}': value
+        for name, value in get_state_cache().stats().items()
+    }
+    buffer = get_history_buffer()
+    if buffer is not None:
+        values.update({
+            f'blackjack_history_buffer_{name}': value
+            for name, value in buffer.stats().items()
+        })
+    return values
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, value in gauges().items():
+        lines.extend([f'# TYPE {name} gauge', f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
+
+def dump(path):
+    """ Writes the metrics to path, replacing it in one step """
+    partial = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'w') as file:
+        file.write(render())
+    os.replace(partial, path)
+
+class QueryTimer:
+    """ Counts a request's queries and their time """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# The timer of the request being served, carried into sync_to_async threads
+current_timer = contextvars.ContextVar('current_timer', default=None)
+
+def time_query(execute, sql, params, many, context):
+    """ Execute wrapper adding each query to the current request's timer, if any """
+    queries = current_timer.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.count += 1
+        queries.seconds += time.perf_counter() - start
+
+def install_query_timer(sender, connection, **kwargs):
+    """ connection_created receiver adding time_query to each new connection """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+class MetricsMiddleware:
+    """
+    Records each request's latency, status and database use by view name.
+    Works both ways, so it keeps an ASGI server's chain async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.dump_path = settings.BLACKJACK_METRICS_DUMP.get('PATH')
+        self.dump_interval = settings.BLACKJACK_METRICS_DUMP.get('INTERVAL', 60)
+        self.dumped_at = time.monotonic()
+        if self.dump_path:
+            atexit.register(dump, self.dump_path)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = QueryTimer()
+        token = current_timer.set(queries)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+
+        self.record(request, response, queries, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryTimer()
+        token = current_timer.set(queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+
+        self.record(request, response, queries, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, queries, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, view=view, method=request.method)
+        REQUEST_QUERIES.observe(queries.count, view=view)
+        REQUEST_DB_SECONDS.observe(queries.seconds, view=view)
+        RESPONSES.inc(view=view, status=response.status_code)
+
+        if self.dump_path and time.monotonic() - self.dumped_at >= self.dump_interval:
+            self.dumped_at = time.monotonic()
+            dump(self.dump_path)
+
+class MetricsPermission(BasePermission):
+    """ Lets settings.BLACKJACK_METRICS_ALLOWED_IPS and staff users read the metrics """
+
+    def has_permission(self, request, view):
+        if request.META.get('REMOTE_ADDR') in settings.BLACKJACK_METRICS_ALLOWED_IPS:
+            return True
+        return bool(request.user and request.user.is_staff)
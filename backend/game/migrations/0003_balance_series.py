@@ -0,0 +1,87 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+# A copy of game.series as of this migration, so later changes to it can't
+# change what the backfill writes
+MAX_BUCKETS = 256
+BATCH_SIZE = 2000
+
+
+def add_point(series, bucket_size, game_number, balance):
+    index = (game_number - 1) // bucket_size
+
+    if series and len(series) - 1 == index:
+        bucket = series[-1]
+        bucket[1] = min(bucket[1], balance)
+        bucket[2] = max(bucket[2], balance)
+        bucket[3] = balance
+    else:
+        series.append([index * bucket_size + 1, balance, balance, balance])
+
+    if len(series) > MAX_BUCKETS:
+        series = [merge(series[i:i + 2]) for i in range(0, len(series), 2)]
+        bucket_size *= 2
+
+    return series, bucket_size
+
+
+def merge(buckets):
+    return [
+        buckets[0][0],
+        min(bucket[1] for bucket in buckets),
+        max(bucket[2] for bucket in buckets),
+        buckets[-1][3],
+    ]
+
+
+def backfill_series(apps, schema_editor):
+    Player = apps.get_model('game', 'Player')
+    BalanceHistory = apps.get_model('game', 'BalanceHistory')
+
+    for player in Player.objects.iterator():
+        series, bucket_size = [], 1
+        history = BalanceHistory.objects.filter(player=player).order_by('id').values_list('id', 'balance')
+        numbered = []
+
+        for game_number, (entry_id, balance) in enumerate(history.iterator(chunk_size=BATCH_SIZE), start=1):
+            numbered.append(BalanceHistory(id=entry_id, game_number=game_number))
+            series, bucket_size = add_point(series, bucket_size, game_number, balance)
+
+            # One UPDATE per batch of rows rather than per row
+            if len(numbered) == BATCH_SIZE:
+                BalanceHistory.objects.bulk_update(numbered, ['game_number'])
+                numbered = []
+
+        if numbered:
+            BalanceHistory.objects.bulk_update(numbered, ['game_number'])
+
+        player.balance_series = series
+        player.series_bucket_size = bucket_size
+        player.save(update_fields=['balance_series', 'series_bucket_size'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_balancehistory_shoe_game_shoe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balancehistory',
+            name='game_number',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='balance_series',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='series_bucket_size',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.RunPython(backfill_series, migrations.RunPython.noop),
+    ]
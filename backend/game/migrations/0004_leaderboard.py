@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, F, When
+
+
+def backfill_rankings(apps, schema_editor):
+    Player = apps.get_model('game', 'Player')
+    Player.objects.update(
+        net_profit=F('total_won') - F('total_lost'),
+        win_rate=Case(
+            When(games_played=0, then=0),
+            default=F('games_won') * 10000 / F('games_played'),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_balance_series'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='net_profit',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='win_rate',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rankings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['balance'], name='game_player_balance_55a5ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['net_profit'], name='game_player_net_pro_d85ac7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['win_rate', 'games_played'], name='game_player_win_rat_97e675_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='session',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_game_session'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='balancehistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='balancehistory',
+            constraint=models.UniqueConstraint(fields=('player', 'game_number'), name='unique_game_number'),
+        ),
+    ]
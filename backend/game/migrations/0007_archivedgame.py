@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_history_buffer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedGame',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('PLAYER_WON', 'Player Won'), ('DEALER_WON', 'Dealer Won'), ('TIE', 'Tie')], max_length=10)),
+                ('player_cards', models.BinaryField()),
+                ('dealer_cards', models.BinaryField()),
+                ('player_score', models.SmallIntegerField()),
+                ('dealer_score', models.SmallIntegerField()),
+                ('bet', models.IntegerField()),
+                ('session', models.UUIDField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
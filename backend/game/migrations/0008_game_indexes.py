@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_archivedgame'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='balancehistory',
+            index=models.Index(fields=['player', 'id'], name='game_balanc_player__03357c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', 'status'], name='game_player__b96cc7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', 'created_at'], name='game_player__526581_idx'),
+        ),
+    ]
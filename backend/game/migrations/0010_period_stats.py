@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_replay_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCursor',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('last_game_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PeriodStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('hands', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('ties', models.IntegerField(default=0)),
+                ('wagered', models.IntegerField(default=0)),
+                ('net', models.IntegerField(default=0)),
+                ('peak', models.IntegerField(default=0)),
+                ('trough', models.IntegerField(default=0)),
+                ('max_drawdown', models.IntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='periodstats',
+            constraint=models.UniqueConstraint(fields=('player', 'period', 'start'), name='unique_player_period'),
+        ),
+    ]
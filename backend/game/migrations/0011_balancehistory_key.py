@@ -0,0 +1,24 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_period_stats'),
+    ]
+
+    operations = [
+        # Added empty first, as a default would give every existing row the same key
+        migrations.AddField(
+            model_name='balancehistory',
+            name='key',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='balancehistory',
+            name='key',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_game_list_by_id'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='RollupCursor',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_remove_rollupcursor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedgame',
+            name='log',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='log',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -1,5 +1,11 @@
+import secrets
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .gameplay import CardShoe, Gameplay
 
 class Player(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -8,27 +14,83 @@ class Player(models.Model):
     games_won = models.IntegerField(default=0)
     total_won = models.IntegerField(default=0)
     total_lost = models.IntegerField(default=0)
+    # Kept up to date at settlement so the leaderboard can rank by index
+    net_profit = models.IntegerField(default=0)
+    win_rate = models.IntegerField(default=0)  # In hundredths of a percent
+    # Downsampled balance history, see series.py
+    balance_series = models.JSONField(default=list)
+    series_bucket_size = models.IntegerField(default=1)
     
-    @property
-    def net_profit(self):
-        return self.total_won - self.total_lost
-
     def log_balance_change(self):
-        BalanceHistory.objects.create(
-            player=self,
-            balance=self.balance
-        )
+        from .history import record_history
+        
+        record_history([BalanceHistory(player=self, balance=self.balance)])
 
     def __str__(self):
         return f"{self.user.username} (Balance: ${self.balance})"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['balance']),
+            models.Index(fields=['net_profit']),
+            models.Index(fields=['win_rate', 'games_played']),
+        ]
+
 class BalanceHistory(models.Model):
     player = models.ForeignKey('Player', on_delete=models.CASCADE)
     balance = models.IntegerField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    game_number = models.IntegerField(null=True)
+    # Set when the row is made, not when a buffered row is inserted
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Makes replaying a logged row idempotent, rows from before it have none
+    key = models.UUIDField(null=True, unique=True, default=uuid.uuid4, editable=False)
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            # Pages through one player's history in id order
+            models.Index(fields=['player', 'id']),
+        ]
+        constraints = [
+            # Lets buffered rows be replayed without duplicating any
+            models.UniqueConstraint(fields=['player', 'game_number'], name='unique_game_number'),
+        ]
+
+class Shoe(models.Model):
+    player = models.OneToOneField(User, on_delete=models.CASCADE)
+    num_decks = models.IntegerField(default=1)
+    # One byte per card code, in dealing order
+    cards = models.BinaryField(default=bytes)
+    position = models.IntegerField(default=0)
+    cut_card = models.IntegerField(default=0)
+    # Reproduces the card order, see replay.py
+    seed = models.BigIntegerField(null=True, blank=True)
+    shuffled_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def for_player(cls, user):
+        """
+        Get the player's shoe, reshuffling it once the cut card is reached. Its
+        row stays locked until the caller's transaction ends, so concurrent
+        deals from it take turns.
+        """
+
+        shoe, created = cls.objects.select_for_update().get_or_create(player=user)
+        if created or shoe.position >= shoe.cut_card:
+            shoe.shuffle()
+            shoe.save()
+
+        return shoe
+
+    def shuffle(self):
+        self.num_decks = settings.BLACKJACK_SHOE_DECKS
+        self.seed = secrets.randbits(63)
+        self.cards = Gameplay.create_shoe(self.num_decks, self.seed)
+        self.position = 0
+        self.cut_card = int(len(self.cards) * settings.BLACKJACK_SHOE_PENETRATION)
+
+    def deck(self):
+        return CardShoe(bytes(self.cards), self.position)
 
 class Game(models.Model):
     GAME_STATUS_CHOICES = (
@@ -43,11 +105,135 @@ class Game(models.Model):
     player_cards = models.JSONField(default=list)
     dealer_cards = models.JSONField(default=list)
     deck = models.JSONField(default=list)
+    shoe = models.ForeignKey(Shoe, null=True, blank=True, on_delete=models.SET_NULL)
+    # Shared by the spots a player opened together against one dealer hand
+    session = models.UUIDField(null=True, blank=True, db_index=True)
+    # The shoe's seed and where each step drew from it, enough to replay the
+    # game, see replay.py. Games dealt from a per-game deck have neither.
+    seed = models.BigIntegerField(null=True, blank=True)
+    # Unbounded, as every hit and mid-hand reshuffle appends to it
+    log = models.TextField(blank=True, default='')
     player_score = models.IntegerField(default=0)
     dealer_score = models.IntegerField(default=0)
     bet = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def get_deck(self):
+        """ Cards left to deal: the player's shoe, or the per-game deck of older games """
+        return self.shoe.deck() if self.shoe_id else self.deck
+
+    def lock(self):
+        """
+        Locks the game's shoe, or the game when it has none, until the
+        transaction ends, and reloads the game. Every action dealing from a
+        shoe locks it first, so one player's concurrent actions take turns
+        and never draw the same cards or lose a move.
+        """
+        if self.shoe_id:
+            shoe = Shoe.objects.select_for_update().get(pk=self.shoe_id)
+        else:
+            Game.objects.select_for_update().filter(pk=self.pk).values_list('pk').get()
+
+        # Reloading drops the cached shoe, so the locked one is put back after
+        self.refresh_from_db()
+        if self.shoe_id:
+            self.shoe = shoe
+
+    def store_deck(self, deck):
+        """ Persist the cards dealt and return the game fields that changed """
+        if self.shoe_id:
+            # The shoe's card order never changes, only its position moves
+            self.shoe.position = deck.position
+            self.shoe.save(update_fields=['position'])
+            return []
+
+        self.deck = deck
+        return ['deck']
+
+    def save_if_active(self, update_fields):
+        """
+        Saves the given fields only while the stored game is still active, so two
+        requests can't both finish the same game. Returns whether it saved.
+        """
+        self.updated_at = timezone.now()
+        values = {name: getattr(self, name) for name in [*update_fields, 'updated_at']}
+        
+        return Game.objects.filter(pk=self.pk, status='ACTIVE').update(**values) == 1
+
+    @staticmethod
+    def save_all_if_active(games, update_fields):
+        """
+        save_if_active for several games in one UPDATE. Returns whether every
+        game was still active, for the caller's transaction to roll back if not.
+        """
+        now = timezone.now()
+        values = {'updated_at': now}
+        for name in update_fields:
+            field = Game._meta.get_field(name)
+            values[name] = models.Case(
+                *(models.When(pk=game.pk, then=models.Value(getattr(game, name), output_field=field))
+                  for game in games),
+                output_field=field
+            )
+
+        saved = Game.objects.filter(pk__in=[game.pk for game in games], status='ACTIVE').update(**values)
+        if saved != len(games):
+            return False
+
+        for game in games:
+            game.updated_at = now
+        return True
+
+    class Meta:
+        db_table = 'game'
+        indexes = [
+            # A player's games by status, and newest first for the game list
+            models.Index(fields=['player', 'status']),
+            models.Index(fields=['player', 'id']),
+        ]
+
+class ArchivedGame(models.Model):
+    """ Compact summary of a finished game moved out of the game table, see archive.py """
+
+    # The game's own id
+    id = models.BigIntegerField(primary_key=True)
+    player = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=Game.GAME_STATUS_CHOICES)
+    # One byte per card code, in the order dealt
+    player_cards = models.BinaryField()
+    dealer_cards = models.BinaryField()
+    player_score = models.SmallIntegerField()
+    dealer_score = models.SmallIntegerField()
+    bet = models.IntegerField()
+    session = models.UUIDField(null=True, blank=True)
+    seed = models.BigIntegerField(null=True, blank=True)
+    log = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+
+class PeriodStats(models.Model):
+    """ A player's results over one hour or one UTC day, kept up by settlement, see rollups.py """
+
+    PERIOD_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+
+    player = models.ForeignKey(User, on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    hands = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    ties = models.IntegerField(default=0)
+    wagered = models.IntegerField(default=0)
+    net = models.IntegerField(default=0)
+    # Highest and lowest running net within the period, so periods combine
+    peak = models.IntegerField(default=0)
+    trough = models.IntegerField(default=0)
+    max_drawdown = models.IntegerField(default=0)
+
     class Meta:
-        db_table = 'game'
\ No newline at end of file
+        constraints = [
+            models.UniqueConstraint(fields=['player', 'period', 'start'], name='unique_player_period'),
+        ]
@@ -0,0 +1,126 @@
+"""
+Re-derives games from their shoe's seed and a log of where each step drew.
+
+A shoe's card order is Gameplay.create_shoe(num_decks, seed), so a game dealt
+from it is fully described by the seed, its bet and Game.log, a space separated
+list of steps that is only ever appended to:
+
+    D<decks>.<position>                   dealt a hand from position onwards
+    D<decks>.<position>.<spot>.<spots>    dealt spot of a multi-spot table
+    H<position>                           the player hit, drawing at position
+    S<position>                           the player stood, the dealer drawing from position
+    X<seed>                               another game reshuffled the shoe to seed
+
+replay plays a log back without the database, and replay_all runs many of them,
+reusing each shoe's shuffle across the hands dealt from it.
+"""
+
+from functools import lru_cache
+
+from .gameplay import Gameplay, Hand
+
+FIELDS = ('player_cards', 'dealer_cards', 'player_score', 'dealer_score', 'status')
+
+def deal_step(num_decks, position, spot=None, spots=None):
+    if spots is None:
+        return f'D{num_decks}.{position}'
+    return f'D{num_decks}.{position}.{spot}.{spots}'
+
+def append_step(game, kind, deck):
+    """ Logs a hit or stand of a game dealt from a shoe, before deck draws its cards """
+    if game.seed is None or not game.shoe_id:
+        return
+
+    if game.shoe.seed != current_seed(game.seed, game.log):
+        game.log += f' X{game.shoe.seed}'
+    game.log += f' {kind}{deck.position}'
+
+def current_seed(seed, log):
+    """ The seed the log's next step draws from """
+    for step in reversed(log.split()):
+        if step[0] == 'X':
+            return int(step[1:])
+    return seed
+
+@lru_cache(maxsize=64)
+def shoe_cards(num_decks, seed):
+    return Gameplay.create_shoe(num_decks, seed)
+
+def replay(seed, log):
+    """
+    Plays a logged game back, returning the player's and dealer's Hand and the
+    game status. Raises ValueError for a log that doesn't parse.
+    """
+    steps = log.split()
+    if not steps or steps[0][0] != 'D':
+        raise ValueError(f'Log must start with a deal: {log!r}')
+
+    num_decks, position, *spot = (int(part) for part in steps[0][1:].split('.'))
+    cards = shoe_cards(num_decks, seed)
+
+    if spot:
+        # A card to each spot then the dealer, twice round
+        spot, spots = spot
+        player = Hand((cards[position + spot], cards[position + spots + 1 + spot]))
+        dealer = Hand((cards[position + spots], cards[position + 2 * spots + 1]))
+    else:
+        player = Hand(cards[position:position + 2])
+        dealer = Hand(cards[position + 2:position + 4])
+
+    status = Gameplay.check_hand_status(player, dealer, False)
+
+    for step in steps[1:]:
+        kind, value = step[0], int(step[1:])
+
+        if kind == 'X':
+            cards = shoe_cards(num_decks, value)
+        elif kind == 'H':
+            player.add(cards[value])
+            status = Gameplay.check_hand_status(player, dealer, False)
+        elif kind == 'S':
+            while dealer.score < 17 and value < len(cards):
+                dealer.add(cards[value])
+                value += 1
+            status = Gameplay.check_hand_status(player, dealer, True)
+        else:
+            raise ValueError(f'Unknown step {step!r} in {log!r}')
+
+    return player, dealer, status
+
+def codes(cards):
+    """ Card codes of a Game's card dicts, or an archived game's bytes or code list """
+    if cards and isinstance(cards[0], dict):
+        return bytes(Gameplay.encode_card(card) for card in cards)
+    return bytes(cards)
+
+def verify(game):
+    """ Names of the recorded fields of a Game or ArchivedGame that its replay disagrees with """
+    player, dealer, status = replay(game.seed, game.log)
+    recorded = (
+        codes(game.player_cards), codes(game.dealer_cards),
+        game.player_score, game.dealer_score, game.status,
+    )
+    replayed = (bytes(player.codes), bytes(dealer.codes), player.score, dealer.score, status)
+
+    return [
+        name for name, before, after in zip(FIELDS, recorded, replayed) if before != after
+    ]
+
+def replay_all(records):
+    """
+    Replays (seed, log, bet) records, returning the count of each status and
+    the total the player won less what they lost, paid as in settlement.payout
+    """
+    statuses = {'ACTIVE': 0, 'PLAYER_WON': 0, 'DEALER_WON': 0, 'TIE': 0}
+    net = 0
+
+    for seed, log, bet in records:
+        player, dealer, status = replay(seed, log)
+        statuses[status] += 1
+
+        if status == 'PLAYER_WON':
+            net += bet * 5 // 2 - bet if player.is_blackjack else bet
+        elif status == 'DEALER_WON':
+            net -= bet
+
+    return statuses, net
@@ -0,0 +1,161 @@
+"""
+Per-player hourly and daily results, kept up as games settle.
+
+settle_games hands each batch of settled games to add_results, in the same
+transaction and under the same player row lock, so the hour and UTC day rows
+they finish in always agree with the player's counters. rebuild_stats
+recomputes every player's rows from their finished games, live and archived,
+one player at a time under that lock, for games settled before stats were
+kept or to repair them.
+
+Periods keep their peak and trough running net along with their drawdown, so
+stats_window combines any window's periods, in O(periods), without games.
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedGame, Game, PeriodStats, Player
+
+# Window: (period, periods in the window)
+RANGES = {
+    '24h': ('hour', 24),
+    '7d': ('day', 7),
+    '30d': ('day', 30),
+    '90d': ('day', 90),
+    '365d': ('day', 365),
+}
+
+STAT_FIELDS = ('hands', 'wins', 'ties', 'wagered', 'net', 'peak', 'trough', 'max_drawdown')
+GAME_FIELDS = ('id', 'player', 'status', 'bet', 'player_score', 'player_cards')
+
+def add_result(stats, status, bet, won, lost):
+    """ Adds a finished game's result to stats, after everything in it """
+    stats.hands += 1
+    stats.wins += status == 'PLAYER_WON'
+    stats.ties += status == 'TIE'
+    stats.wagered += bet
+    stats.net += won - lost
+    stats.peak = max(stats.peak, stats.net)
+    stats.trough = min(stats.trough, stats.net)
+    stats.max_drawdown = max(stats.max_drawdown, stats.peak - stats.net)
+
+def combine(stats, later):
+    """ Adds the stats of a later stretch of play to stats """
+    # The worst fall may start before later and end inside it
+    stats.max_drawdown = max(
+        stats.max_drawdown, later.max_drawdown, stats.peak - (stats.net + later.trough)
+    )
+    stats.peak = max(stats.peak, stats.net + later.peak)
+    stats.trough = min(stats.trough, stats.net + later.trough)
+    stats.net += later.net
+    stats.hands += later.hands
+    stats.wins += later.wins
+    stats.ties += later.ties
+    stats.wagered += later.wagered
+
+def period_starts(finished):
+    hour = finished.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return (('hour', hour), ('day', hour.replace(hour=0)))
+
+def add_results(player_id, results, finished=None):
+    """
+    Adds (status, bet, won, lost) results of a player's games, in the order
+    they settled, to the periods they finished in, now unless given. Runs in
+    the caller's transaction, which must hold the player's row lock.
+    """
+    batch = {}
+    for result in results:
+        add_to_batch(batch, player_id, finished or timezone.now(), *result)
+
+    save_periods(player_id, batch)
+
+def add_to_batch(batch, player_id, finished, status, bet, won, lost):
+    """ Adds a result to the unsaved periods of a {(period, start): PeriodStats} batch """
+    for period, start in period_starts(finished):
+        if (period, start) not in batch:
+            batch[period, start] = PeriodStats(player_id=player_id, period=period, start=start)
+        add_result(batch[period, start], status, bet, won, lost)
+
+def save_periods(player_id, batch):
+    """ Combines a {(period, start): PeriodStats} batch into the player's saved periods """
+    existing = {
+        (stats.period, stats.start): stats
+        for stats in PeriodStats.objects.filter(
+            player_id=player_id, start__in={start for _, start in batch}
+        )
+    }
+
+    created, updated = [], []
+    for key, stats in batch.items():
+        if key in existing:
+            combine(existing[key], stats)
+            updated.append(existing[key])
+        else:
+            created.append(stats)
+
+    if created:
+        PeriodStats.objects.bulk_create(created)
+    if updated:
+        PeriodStats.objects.bulk_update(updated, STAT_FIELDS)
+
+def finished_games(player_id):
+    """ The player's finished games, live or archived, in the order they finished """
+    live = Game.objects.filter(player_id=player_id).exclude(status='ACTIVE').only(
+        *GAME_FIELDS, 'updated_at'
+    )
+    archived = ArchivedGame.objects.filter(player_id=player_id).only(*GAME_FIELDS, 'finished_at')
+
+    # Live games first, so one archived in between is read twice rather than missed
+    games = {game.id: game for game in live.iterator(chunk_size=2000)}
+    for game in archived.iterator(chunk_size=2000):
+        games.setdefault(game.id, game)
+
+    return sorted(games.values(), key=lambda game: (finished_at(game), game.id))
+
+def finished_at(game):
+    return game.finished_at if isinstance(game, ArchivedGame) else game.updated_at
+
+def rebuild_player(player_id):
+    """ Recomputes one player's periods from their games, returning how many games """
+    from .settlement import payout
+
+    with transaction.atomic():
+        # Settlement holds the same lock while it adds to the periods
+        Player.objects.select_for_update().only('pk').get(user_id=player_id)
+        games = finished_games(player_id)
+
+        batch = {}
+        for game in games:
+            _, won, lost = payout(game)
+            add_to_batch(batch, player_id, finished_at(game), game.status, game.bet, won, lost)
+
+        PeriodStats.objects.filter(player_id=player_id).delete()
+        PeriodStats.objects.bulk_create(batch.values(), batch_size=1000)
+
+    return len(games)
+
+def rebuild_stats():
+    """ Recomputes every player's periods, returning how many games they hold """
+    player_ids = Player.objects.order_by('user_id').values_list('user_id', flat=True)
+    return sum(rebuild_player(player_id) for player_id in player_ids.iterator(chunk_size=1000))
+
+def stats_window(user, window='30d'):
+    """
+    The user's periods in the window, oldest first, and their combined totals
+    as an unsaved PeriodStats starting where the window does
+    """
+    period, count = RANGES[window]
+    start = dict(period_starts(timezone.now()))[period]
+    start -= timedelta(hours=count - 1) if period == 'hour' else timedelta(days=count - 1)
+
+    periods = list(
+        PeriodStats.objects.filter(player=user, period=period, start__gte=start).order_by('start')
+    )
+    totals = PeriodStats(player=user, period=period, start=start)
+    for stats in periods:
+        combine(totals, stats)
+
+    return periods, totals
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Game, Player, BalanceHistory
+from .models import Game, Player, BalanceHistory, PeriodStats
+from .metrics import SERIALIZER_SECONDS, timed
+from .series import as_points
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -30,12 +32,16 @@ class GameSerializer(serializers.ModelSerializer):
     class Meta:
         model = Game
         fields = ('id', 'player', 'status', 'player_cards', 'dealer_cards',
-                 'player_score', 'dealer_score', 'bet', 'created_at')
+                 'player_score', 'dealer_score', 'bet', 'session', 'created_at')
+        
+    def to_representation(self, instance):
+        with timed(SERIALIZER_SECONDS, serializer='GameSerializer'):
+            return super().to_representation(instance)
         
 class BalanceHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = BalanceHistory
-        fields = ['balance', 'timestamp']
+        fields = ['balance', 'game_number', 'timestamp']
 
 class PlayerStatsSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username')
@@ -49,8 +55,12 @@ class PlayerStatsSerializer(serializers.ModelSerializer):
                  'win_rate')
 
     def get_balance_history(self, object):
-        history = BalanceHistory.objects.filter(player=object).order_by('timestamp')
-        return [{'balance': h.balance, 'timestamp': h.timestamp} for h in history]
+        return as_points(object.balance_series)
 
     def get_win_rate(self, object):
-        return 0 if object.games_played == 0 else round((object.games_won / object.games_played) * 100, 2)
\ No newline at end of file
+        return 0 if object.games_played == 0 else round((object.games_won / object.games_played) * 100, 2)
+
+class PeriodStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PeriodStats
+        fields = ('start', 'hands', 'wins', 'ties', 'wagered', 'net', 'max_drawdown')
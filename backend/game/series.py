@@ -0,0 +1,43 @@
+"""
+Bounded balance history series, maintained one game at a time.
+
+Games are grouped into fixed-size buckets of consecutive game numbers, each
+kept as [first game number, min balance, max balance, last balance]. When the
+series outgrows MAX_BUCKETS, neighbouring buckets are merged in pairs and the
+bucket size doubles, so the series stays bounded however many games are played.
+"""
+
+MAX_BUCKETS = 256
+
+def add_point(series, bucket_size, game_number, balance):
+    """ Adds a game's closing balance and returns the new (series, bucket_size) """
+    index = (game_number - 1) // bucket_size
+
+    if series and len(series) - 1 == index:
+        bucket = series[-1]
+        bucket[1] = min(bucket[1], balance)
+        bucket[2] = max(bucket[2], balance)
+        bucket[3] = balance
+    else:
+        series.append([index * bucket_size + 1, balance, balance, balance])
+
+    if len(series) > MAX_BUCKETS:
+        series = [_merge(series[i:i + 2]) for i in range(0, len(series), 2)]
+        bucket_size *= 2
+
+    return series, bucket_size
+
+def _merge(buckets):
+    return [
+        buckets[0][0],
+        min(bucket[1] for bucket in buckets),
+        max(bucket[2] for bucket in buckets),
+        buckets[-1][3],
+    ]
+
+def as_points(series):
+    """ Formats the series for the API, one point per bucket """
+    return [
+        {'game_number': start, 'balance': last, 'min': low, 'max': high}
+        for start, low, high, last in series
+    ]
@@ -0,0 +1,304 @@
+"""
+Game actions shared by the HTTP views and the WebSocket channel.
+
+Each action raises ValueError with a message for the player when it isn't
+allowed, and writes everything it changes in a single transaction.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from .cache import game_key, get_state_cache, profile_key
+from .gameplay import CARD_VALUES, Gameplay, Hand
+from .metrics import STEP_SECONDS, timed
+from .models import Game, Player, Shoe
+from .replay import append_step, deal_step
+from .serializers import GameSerializer
+from .settlement import payout, settle_game, settle_games
+from . import strategy
+
+ACTIONS = ('hit', 'stand')
+
+def validate_bet(bet):
+    """
+    Checks a bet is a positive whole number, as every way of starting a game
+    takes it. The balance covering it is checked when it's taken.
+    """
+
+    # bool is an int subclass, so True would pass isinstance
+    if type(bet) is not int or bet <= 0:
+        raise ValueError('Bet must be a positive whole number')
+
+def start_game(user, bet):
+    """ Takes the bet and deals a new game from the player's shoe """
+
+    game, _ = play_hand(user, bet, actions=[])
+    return game
+
+def start_spots(user, bets):
+    """
+    Takes every bet and deals one spot per bet against a shared dealer hand,
+    as at a multi-spot table. Spots are hit one at a time, and standing on any
+    of them stands the rest.
+    """
+
+    if not bets or len(bets) > settings.BLACKJACK_MAX_SPOTS:
+        raise ValueError(f'Bets must list 1 to {settings.BLACKJACK_MAX_SPOTS} spots')
+    for bet in bets:
+        validate_bet(bet)
+
+    with transaction.atomic():
+        # Locks the shoe before the player row, in the same order as hit and stand
+        shoe = Shoe.for_player(user)
+
+        # Takes every bet at once, only if the balance covers all of them
+        debited = Player.objects.filter(user=user, balance__gte=sum(bets)).update(
+            balance=F('balance') - sum(bets)
+        )
+        if not debited:
+            raise ValueError('Insufficient funds')
+        get_state_cache().delete_on_commit(profile_key(user.id))
+
+        # Deals every spot and the dealer from the player's shoe
+        with timed(STEP_SECONDS, step='deal'):
+            deck = shoe.deck()
+            dealt_at = deck.position
+            spot_cards, dealer_cards, _ = Gameplay.deal_spots(deck, len(bets))
+
+        shoe.position = deck.position
+        shoe.save(update_fields=['position'])
+
+        dealer_hand = Hand.from_cards(dealer_cards)
+        session = uuid.uuid4()
+        games = []
+
+        for spot, (bet, player_cards) in enumerate(zip(bets, spot_cards)):
+            player_hand = Hand.from_cards(player_cards)
+            games.append(Game(
+                player=user,
+                shoe=shoe,
+                session=session,
+                seed=shoe.seed,
+                log=deal_step(shoe.num_decks, dealt_at, spot, len(bets)),
+                player_cards=player_cards,
+                dealer_cards=dealer_cards,
+                player_score=player_hand.score,
+                dealer_score=dealer_hand.score,
+                status=Gameplay.check_hand_status(player_hand, dealer_hand, False),
+                bet=bet
+            ))
+        Game.objects.bulk_create(games)
+
+        # Settles every spot that a natural blackjack already decided
+        finished = [game for game in games if game.status != 'ACTIVE']
+        if finished:
+            settle_games(finished)
+
+    return games
+
+def play_hand(user, bet, actions=None, strategy_name=None):
+    """
+    Takes the bet, deals a game and plays it server-side in one transaction:
+    the given actions in order, or the named strategy until the hand is done.
+    Actions left once the game is complete are ignored, and a game whose
+    actions run out first stays active. The game is written once at the end,
+    however many cards were drawn. Returns the game and the actions played.
+    """
+
+    validate_bet(bet)
+
+    if strategy_name is not None:
+        choose = strategy.STRATEGIES.get(strategy_name)
+        if choose is None:
+            raise ValueError(f'Unknown strategy: {strategy_name}')
+    elif any(move not in ACTIONS for move in actions):
+        raise ValueError(f'Actions must be one of: {", ".join(ACTIONS)}')
+
+    with transaction.atomic():
+        # Locks the shoe before the player row, in the same order as hit and stand
+        shoe = Shoe.for_player(user)
+
+        # Takes the bet only if the balance covers it, checked in the database
+        # so concurrent games can't overdraw, and prevents bypass from the frontend
+        debited = Player.objects.filter(user=user, balance__gte=bet).update(
+            balance=F('balance') - bet
+        )
+        if not debited:
+            raise ValueError('Insufficient funds')
+        get_state_cache().delete_on_commit(profile_key(user.id))
+
+        # Deals initial cards from the player's shoe
+        with timed(STEP_SECONDS, step='deal'):
+            deck = shoe.deck()
+            steps = [deal_step(shoe.num_decks, deck.position)]
+            player_cards, dealer_cards, _ = Gameplay.deal_initial_cards(deck)
+
+        # Calculates initial scores
+        player_hand = Hand.from_cards(player_cards)
+        dealer_hand = Hand.from_cards(dealer_cards)
+
+        # Checks if anyone has blackjack
+        game_status = Gameplay.check_hand_status(player_hand, dealer_hand, False)
+
+        # Plays the hand, only the dealer's first card being face up
+        upcard = CARD_VALUES[Gameplay.encode_card(dealer_cards[0])]
+        pending = iter(actions) if strategy_name is None else None
+        played = []
+
+        while game_status == 'ACTIVE':
+            move = choose(player_hand, upcard) if pending is None else next(pending, None)
+            if move is None:
+                break
+            played.append(move)
+            steps.append(f'{move[0].upper()}{deck.position}')
+
+            if move == 'hit':
+                deck, player_cards, new_card = Gameplay.hit(deck, player_cards)
+                player_hand.add_card(new_card)
+                game_status = Gameplay.check_hand_status(player_hand, dealer_hand, False)
+            else:
+                with timed(STEP_SECONDS, step='dealer_play'):
+                    deck, dealer_cards = Gameplay.play_dealer_hand(deck, dealer_cards, dealer_hand)
+                game_status = Gameplay.check_hand_status(player_hand, dealer_hand, True)
+
+        shoe.position = deck.position
+        shoe.save(update_fields=['position'])
+
+        # Creates new game instance
+        game = Game.objects.create(
+            player=user,
+            shoe=shoe,
+            seed=shoe.seed,
+            log=' '.join(steps),
+            player_cards=player_cards,
+            dealer_cards=dealer_cards,
+            player_score=player_hand.score,
+            dealer_score=dealer_hand.score,
+            status=game_status,
+            bet=bet
+        )
+
+        # Settles the game right away if it's already over
+        if game_status != 'ACTIVE':
+            settle_game(game)
+
+    return game, played
+
+def hit(game):
+    """ Player draws another card """
+
+    with transaction.atomic():
+        # Draws from the shoe as it is now, after any other action of the player
+        game.lock()
+
+        # Checks if game is still active
+        if game.status != 'ACTIVE':
+            raise ValueError('Game is already complete')
+
+        player_hand = Hand.from_cards(game.player_cards)
+        deck = game.get_deck()
+        append_step(game, 'H', deck)
+        deck, new_player_cards, new_card = Gameplay.hit(deck, game.player_cards)
+
+        # Calculates new score
+        player_hand.add_card(new_card)
+
+        # Checks game status
+        game_status = Gameplay.check_hand_status(
+            player_hand, Hand.from_cards(game.dealer_cards), False
+        )
+
+        # Updates game, unless another request finished it first
+        changed_fields = game.store_deck(deck)
+        game.player_cards = new_player_cards
+        game.player_score = player_hand.score
+        game.status = game_status
+
+        if not game.save_if_active(['player_cards', 'player_score', 'status', 'log', *changed_fields]):
+            raise ValueError('Game is already complete')
+
+        # Settles the game if the player busted
+        if game_status != 'ACTIVE':
+            settle_game(game)
+
+    return game
+
+def stand(game):
+    """
+    Player stands, dealer plays. Every other spot still active in the game's
+    session stands with it, so the dealer plays and the spots settle once for
+    the whole table. Returns the games it finished.
+    """
+
+    with transaction.atomic():
+        # Draws from the shoe as it is now, after any other action of the player
+        game.lock()
+
+        if game.status != 'ACTIVE':
+            raise ValueError('Game is already complete')
+
+        spots = [game]
+        if game.session:
+            spots = [
+                game if spot.pk == game.pk else spot
+                for spot in Game.objects.filter(session=game.session, status='ACTIVE').order_by('id')
+            ]
+
+        # Dealer plays their hand
+        with timed(STEP_SECONDS, step='dealer_play'):
+            dealer_hand = Hand.from_cards(game.dealer_cards)
+            deck = game.get_deck()
+            for spot in spots:
+                spot.shoe = game.shoe
+                append_step(spot, 'S', deck)
+            final_deck, final_dealer_cards = Gameplay.play_dealer_hand(
+                deck, game.dealer_cards, dealer_hand
+            )
+
+        # Update games, unless another request finished them first
+        changed_fields = game.store_deck(final_deck)
+        for spot in spots:
+            spot.dealer_cards = final_dealer_cards
+            spot.dealer_score = dealer_hand.score
+
+            # Determines final game status
+            spot.status = Gameplay.check_hand_status(
+                Hand.from_cards(spot.player_cards), dealer_hand, True
+            )
+
+        update_fields = ['dealer_cards', 'dealer_score', 'status', 'log', *changed_fields]
+        if len(spots) == 1:
+            saved = game.save_if_active(update_fields)
+        else:
+            saved = Game.save_all_if_active(spots, update_fields)
+        if not saved:
+            raise ValueError('Game is already complete')
+
+        # Updates player statistics
+        settle_games(spots)
+
+        # The other spots changed too, so their cached states are dropped
+        for spot in spots:
+            if spot is not game:
+                get_state_cache().delete_on_commit(game_key(spot.player_id, spot.id))
+
+    return spots
+
+def game_state(game):
+    """ Serializes the game and writes it through to the state cache """
+
+    data = dict(GameSerializer(game).data)
+    get_state_cache().set_on_commit(game_key(game.player_id, game.id), data)
+
+    return data
+
+def settlement(game):
+    """ What a finished game paid out, or None while it's active """
+
+    if game.status == 'ACTIVE':
+        return None
+
+    returned, won, lost = payout(game)
+    return {'returned': returned, 'won': won, 'lost': lost}
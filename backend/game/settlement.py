@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models import F
+from .cache import get_state_cache, profile_key
+from .history import record_history
+from .metrics import STEP_SECONDS, timed_call
+from .models import BalanceHistory, Player
+from .rollups import add_results
+from .series import add_point
+
+def payout(game):
+    """ Chips returned to the player, and the amounts won and lost, for a finished game """
+    
+    if game.status == 'PLAYER_WON':
+        # Natural blackjack pays 3:2, any other win pays 1:1
+        if game.player_score == 21 and len(game.player_cards) == 2:
+            returned = game.bet * 5 // 2
+        else:
+            returned = game.bet * 2
+            
+        return returned, returned - game.bet, 0
+    
+    elif game.status == 'DEALER_WON':
+        return 0, 0, game.bet
+    
+    # A tie returns the bet
+    return game.bet, 0, 0
+
+def settle_game(game):
+    """ Credits a single finished game, see settle_games """
+    
+    settle_games([game])
+
+@timed_call(STEP_SECONDS, step='settlement')
+def settle_games(games):
+    """
+    Credits finished games of one player in a single transaction (or the
+    caller's). Counters are updated database-side, and the player row is
+    locked first so the downsampled balance series can be extended in the
+    same UPDATE. However many games are settled, that is one UPDATE, and
+    their history rows go to the write-behind buffer in history.py. Their
+    hour and day stats are added to under the same lock, see rollups.py.
+    """
+    
+    player_id = games[0].player_id
+    
+    with transaction.atomic(savepoint=False):
+        player = (
+            Player.objects.select_for_update()
+            .only('balance', 'games_played', 'games_won', 'balance_series', 'series_bucket_size')
+            .get(user_id=player_id)
+        )
+        balance = player.balance
+        game_number = player.games_played
+        games_won = player.games_won
+        series, bucket_size = player.balance_series, player.series_bucket_size
+        total_returned = total_won = total_lost = 0
+        history = []
+        results = []
+        
+        # Games are numbered in the order given
+        for game in games:
+            returned, won, lost = payout(game)
+            results.append((game.status, game.bet, won, lost))
+            total_returned += returned
+            total_won += won
+            total_lost += lost
+            
+            balance += returned
+            game_number += 1
+            games_won += 1 if game.status == 'PLAYER_WON' else 0
+            series, bucket_size = add_point(series, bucket_size, game_number, balance)
+            history.append(BalanceHistory(player=player, balance=balance, game_number=game_number))
+        
+        Player.objects.filter(pk=player.pk).update(
+            balance=F('balance') + total_returned,
+            total_won=F('total_won') + total_won,
+            total_lost=F('total_lost') + total_lost,
+            games_won=F('games_won') + games_won - player.games_won,
+            games_played=F('games_played') + len(games),
+            net_profit=F('net_profit') + total_won - total_lost,
+            win_rate=games_won * 10000 // game_number,
+            balance_series=series,
+            series_bucket_size=bucket_size,
+        )
+        
+        add_results(player_id, results)
+        record_history(history)
+        get_state_cache().delete_on_commit(profile_key(player_id))
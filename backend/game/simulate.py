@@ -0,0 +1,269 @@
+"""
+Monte Carlo simulation of the table rules in gameplay.py.
+
+Hands are played in batches of independent lanes, each lane dealing from its
+own shoe with the same cut card as Shoe.for_player. Cards use the integer
+encoding from gameplay.py, so every step of a round is a NumPy operation over
+all lanes at once instead of a Python loop over card dicts.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from . import strategy
+from .gameplay import CARD_VALUES, CARDS
+
+VALUES = np.frombuffer(CARD_VALUES, dtype=np.uint8).astype(np.int16)
+
+# Net result per unit bet, as paid by settlement.payout
+NATURAL_PAYOUT = 1.5
+WIN_PAYOUT = 1.0
+
+DEALER_STANDS_ON = 17
+
+def scores(hard, has_ace):
+    """ Vectorised Hand.score and Hand.is_soft """
+    soft = has_ace & (hard <= 11)
+    return np.where(soft, hard + 10, hard), soft
+
+def stand_on(total):
+    """ Policy that hits until the player's score reaches total """
+    def policy(score, soft, upcard):
+        return score < total
+    return policy
+
+def never_bust(score, soft, upcard):
+    """ Policy that only hits when the next card can't bust the hand """
+    return (score <= 11) | (soft & (score < 18))
+
+_basic_hits = None
+
+def basic_strategy(score, soft, upcard):
+    """ Policy that hits whenever the strategy table gives hitting the higher EV """
+    global _basic_hits
+    if _basic_hits is None:
+        table = np.array(strategy.load_table(), dtype=np.float32)
+        table = table.reshape(len(strategy.UPCARDS), 2, strategy.MAX_SCORE + 1, 2)
+        _basic_hits = table[..., 1] > table[..., 0]
+
+    return _basic_hits[upcard - 1, soft.astype(np.intp), np.minimum(score, strategy.MAX_SCORE)]
+
+POLICIES = {
+    'mimic-dealer': stand_on(DEALER_STANDS_ON),
+    'never-bust': never_bust,
+    'basic': basic_strategy,
+}
+
+@dataclass
+class SimulationResult:
+    hands: int = 0
+    wins: int = 0
+    ties: int = 0
+    losses: int = 0
+    blackjacks: int = 0
+    net: float = 0.0
+    net_squared: float = 0.0
+
+    def add(self, outcomes):
+        """ Accumulates an array of net results per unit bet """
+        self.hands += len(outcomes)
+        self.wins += int(np.count_nonzero(outcomes > 0))
+        self.ties += int(np.count_nonzero(outcomes == 0))
+        self.losses += int(np.count_nonzero(outcomes < 0))
+        self.blackjacks += int(np.count_nonzero(outcomes == NATURAL_PAYOUT))
+        self.net += float(outcomes.sum())
+        self.net_squared += float(np.square(outcomes).sum())
+
+    def merge(self, other):
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+        return self
+
+    def rate(self, count):
+        return count / self.hands if self.hands else 0.0
+
+    def rate_interval(self, count, z=1.96):
+        """ Normal-approximation interval for the rate of count """
+        rate = self.rate(count)
+        margin = z * math.sqrt(rate * (1 - rate) / self.hands) if self.hands else 0.0
+        return rate - margin, rate + margin
+
+    @property
+    def mean(self):
+        return self.net / self.hands if self.hands else 0.0
+
+    @property
+    def house_edge(self):
+        return -self.mean
+
+    @property
+    def variance(self):
+        if self.hands < 2:
+            return 0.0
+        return (self.net_squared - self.hands * self.mean ** 2) / (self.hands - 1)
+
+    @property
+    def std_error(self):
+        return math.sqrt(self.variance / self.hands) if self.hands else 0.0
+
+    def confidence_interval(self, z=1.96):
+        """ Normal-approximation interval for the house edge """
+        margin = z * self.std_error
+        return self.house_edge - margin, self.house_edge + margin
+
+class ShoeBatch:
+    """ One shuffled shoe of encoded cards per lane, with a dealing position """
+
+    def __init__(self, rng, lanes, num_decks, penetration):
+        self.rng = rng
+        self.lanes = lanes
+        self.cards = np.tile(np.arange(len(CARDS), dtype=np.uint8), (lanes, num_decks))
+        self.rng.permuted(self.cards, axis=1, out=self.cards)
+        self.position = np.zeros(lanes, dtype=np.intp)
+        self.size = self.cards.shape[1]
+        self.cut_card = int(self.size * penetration)
+        self.lane_index = np.arange(lanes)
+
+    def reshuffle_past_cut_card(self):
+        past = self.position >= self.cut_card
+        if past.any():
+            self.cards[past] = self.rng.permuted(self.cards[past], axis=1)
+            self.position[past] = 0
+
+    def draw(self, mask):
+        """ Deals one card to every lane in mask whose shoe isn't empty """
+        dealt = mask & (self.position < self.size)
+        lanes = self.lane_index[dealt]
+
+        values = np.zeros(self.lanes, dtype=np.int16)
+        values[lanes] = VALUES[self.cards[lanes, self.position[lanes]]]
+        self.position[lanes] += 1
+
+        return values, dealt
+
+def _deal(shoe, mask, hard, has_ace):
+    values, dealt = shoe.draw(mask)
+    hard += values
+    has_ace |= values == 1
+    return values, dealt
+
+def play_round(shoe, policy):
+    """ Plays one hand in every lane and returns the net result per unit bet """
+    lanes = shoe.lanes
+    everyone = np.ones(lanes, dtype=bool)
+    player_hard = np.zeros(lanes, dtype=np.int16)
+    player_ace = np.zeros(lanes, dtype=bool)
+    dealer_hard = np.zeros(lanes, dtype=np.int16)
+    dealer_ace = np.zeros(lanes, dtype=bool)
+
+    shoe.reshuffle_past_cut_card()
+
+    # Same order as Gameplay.deal_initial_cards, dealer's first card is face up
+    _deal(shoe, everyone, player_hard, player_ace)
+    _deal(shoe, everyone, player_hard, player_ace)
+    upcard, _ = _deal(shoe, everyone, dealer_hard, dealer_ace)
+    _deal(shoe, everyone, dealer_hard, dealer_ace)
+
+    player_score, _ = scores(player_hard, player_ace)
+    dealer_score, _ = scores(dealer_hard, dealer_ace)
+    player_blackjack = player_score == 21
+    dealer_blackjack = dealer_score == 21
+
+    net = np.zeros(lanes, dtype=np.float64)
+    net[player_blackjack & ~dealer_blackjack] = NATURAL_PAYOUT
+    net[dealer_blackjack & ~player_blackjack] = -1.0
+    playing = ~(player_blackjack | dealer_blackjack)
+
+    # Player acts until the policy stands, the hand busts or the shoe runs out
+    hitting = playing.copy()
+    while True:
+        player_score, player_soft = scores(player_hard, player_ace)
+        hitting &= policy(player_score, player_soft, upcard)
+        if not hitting.any():
+            break
+
+        _, dealt = _deal(shoe, hitting, player_hard, player_ace)
+        hitting &= dealt
+        busted = hitting & (player_hard > 21)
+        net[busted] = -1.0
+        playing &= ~busted
+        hitting &= ~busted
+
+    # Dealer draws to 17 for every hand still standing
+    drawing = playing.copy()
+    while True:
+        dealer_score, _ = scores(dealer_hard, dealer_ace)
+        drawing &= dealer_score < DEALER_STANDS_ON
+        if not drawing.any():
+            break
+
+        _, dealt = _deal(shoe, drawing, dealer_hard, dealer_ace)
+        drawing &= dealt
+
+    player_score, _ = scores(player_hard, player_ace)
+    dealer_score, _ = scores(dealer_hard, dealer_ace)
+    won = playing & ((dealer_score > 21) | (player_score > dealer_score))
+    lost = playing & (dealer_score <= 21) & (dealer_score > player_score)
+    net[won] = WIN_PAYOUT
+    net[lost] = -1.0
+
+    return net
+
+def simulate(hands, policy='mimic-dealer', num_decks=6, penetration=0.75,
+             lanes=10000, seed=None):
+    """ Plays the given number of hands and returns a SimulationResult """
+    if isinstance(policy, str):
+        policy = POLICIES[policy]
+
+    rng = np.random.default_rng(seed)
+    shoe = ShoeBatch(rng, min(lanes, hands), num_decks, penetration)
+    result = SimulationResult()
+
+    while result.hands < hands:
+        net = play_round(shoe, policy)
+        result.add(net[:hands - result.hands])
+
+    return result
+
+def _simulate_shard(args):
+    hands, policy, num_decks, penetration, lanes, seed_sequence = args
+    return simulate(hands, policy, num_decks, penetration, lanes, seed_sequence)
+
+def simulate_parallel(hands, policy='mimic-dealer', num_decks=6, penetration=0.75,
+                      lanes=10000, seed=None, workers=None, shard_size=250000):
+    """
+    Splits the hands into fixed-size shards and plays them across worker
+    processes, or in this one for a single worker. Each shard gets its own
+    stream spawned from the master seed, and shards are merged in order, so the
+    result depends only on the seed and the shard size, not on how many
+    workers ran them.
+    """
+    if not isinstance(policy, str):
+        raise ValueError("Parallel simulation needs a policy name from POLICIES.")
+
+    shard_sizes = [shard_size] * (hands // shard_size)
+    if hands % shard_size:
+        shard_sizes.append(hands % shard_size)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    shards = [
+        (size, policy, num_decks, penetration, lanes, shard_seed)
+        for size, shard_seed in zip(shard_sizes, seeds)
+    ]
+
+    result = SimulationResult()
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for shard_result in map(_simulate_shard, shards):
+            result.merge(shard_result)
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard_result in executor.map(_simulate_shard, shards):
+            result.merge(shard_result)
+
+    return result
@@ -0,0 +1,136 @@
+"""
+WebSocket game channel, served by blackjack/asgi.py at /ws/game/.
+
+A client keeps the connection open for the whole session, and authenticates
+with its access token in the first message, within AUTH_TIMEOUT seconds. The
+token isn't taken from the URL, which servers write to their access logs. It
+is checked again on every message, through the same cache as HTTP requests,
+so the connection closes once the token expires or its user is deactivated,
+at most BLACKJACK_AUTH_CACHE's TTL later in another process. Messages are
+JSON objects:
+
+    {"action": "authenticate", "token": "<access token>"}
+    {"action": "new_game", "bet": 10}
+    {"action": "hit"}
+    {"action": "stand"}
+
+hit and stand act on the last game started on the connection unless a "game"
+id is given. authenticate is answered with {"type": "authenticated"}, and
+every other message with one frame holding the game state and the player's
+balance and stats, or an error. An idle connection is only a
+coroutine waiting on receive, so holding many open tables is cheap.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import services
+from .authentication import averify_token
+from .models import Game, Player
+
+# Policy violation, sent when the token is missing or stops being valid
+CLOSE_UNAUTHORIZED = 1008
+
+# Seconds a new connection has to send its token
+AUTH_TIMEOUT = 10
+
+def database_call(function):
+    """ Runs function in a worker thread, recycling its connection like a request would """
+    def call(*args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False)
+
+async def authenticate(raw_token):
+    """ The token's user, skipping the database while the token cache holds it """
+    user, _, _ = await averify_token(raw_token, run=database_call)
+    return user
+
+@database_call
+def play(user, message, game_id):
+    if not isinstance(message, dict):
+        raise ValueError('Messages must be JSON objects')
+
+    action = message.get('action')
+
+    if action == 'new_game':
+        game = services.start_game(user, message.get('bet', 10))
+    elif action in ('hit', 'stand'):
+        try:
+            game = Game.objects.get(player=user, pk=message.get('game', game_id))
+        except Game.DoesNotExist:
+            raise ValueError('Game not found')
+        getattr(services, action)(game)
+    else:
+        raise ValueError(f'Unknown action: {action}')
+
+    player = Player.objects.values(
+        'balance', 'games_played', 'games_won', 'total_won', 'total_lost', 'net_profit'
+    ).get(user=user)
+
+    return {'type': 'state', 'game': services.game_state(game), 'player': player}
+
+def read_token(message):
+    """ The raw token of an authenticate message, raising ValueError for any other """
+    body = json.loads(message.get('text') or message.get('bytes'))
+    if not isinstance(body, dict) or body.get('action') != 'authenticate':
+        raise ValueError('The first message must authenticate')
+
+    token = body.get('token')
+    if not isinstance(token, str) or not token:
+        raise ValueError('The first message must authenticate')
+
+    # Bytes, as the token cache holds raw tokens from the Authorization header
+    return token.encode()
+
+async def game_socket(scope, receive, send):
+    if (await receive())['type'] != 'websocket.connect':
+        return
+
+    await send({'type': 'websocket.accept'})
+
+    try:
+        message = await asyncio.wait_for(receive(), AUTH_TIMEOUT)
+    except asyncio.TimeoutError:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    if message['type'] == 'websocket.disconnect':
+        return
+
+    try:
+        raw_token = read_token(message)
+        user = await authenticate(raw_token)
+    except (AuthenticationFailed, InvalidToken, TypeError, ValueError):
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    await send({'type': 'websocket.send', 'text': json.dumps({'type': 'authenticated'})})
+    game_id = None
+
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+
+        try:
+            user = await authenticate(raw_token)
+        except (AuthenticationFailed, InvalidToken):
+            await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+
+        try:
+            frame = await play(user, json.loads(message.get('text') or message.get('bytes')), game_id)
+            game_id = frame['game']['id']
+        except (TypeError, ValueError) as e:
+            frame = {'type': 'error', 'error': str(e)}
+
+        await send({'type': 'websocket.send', 'text': json.dumps(frame, cls=DjangoJSONEncoder)})
@@ -0,0 +1,152 @@
+"""
+Hit/stand strategy and expected values for every hand state.
+
+The table is computed once by dynamic programming over (upcard, soft, score)
+states with infinite-deck card odds, under the dealer rule in
+Gameplay.play_dealer_hand. Hints are only asked for active games, so the
+dealer's odds are conditioned on not holding a natural. The result is stored as
+packed float32 pairs and loaded on first use.
+"""
+
+import struct
+from functools import lru_cache
+from pathlib import Path
+
+TABLE_PATH = Path(__file__).resolve().parent / 'data' / 'strategy.bin'
+
+# Card values 1 (Ace) to 10 and their odds in a single deck
+CARD_ODDS = {value: (4 if value == 10 else 1) / 13 for value in range(1, 11)}
+
+UPCARDS = range(1, 11)
+MAX_SCORE = 21
+DEALER_STANDS_ON = 17
+
+# Layout: [upcard][soft][score] -> (stand EV, hit EV)
+TABLE_SIZE = len(UPCARDS) * 2 * (MAX_SCORE + 1) * 2
+TABLE_FORMAT = f'<{TABLE_SIZE}f'
+
+def _score(hard, has_ace):
+    return hard + 10 if has_ace and hard <= 11 else hard
+
+def _dealer_outcomes(upcard):
+    """ Odds of each final dealer score (22 meaning bust) given the upcard """
+    @lru_cache(maxsize=None)
+    def play(hard, has_ace):
+        score = _score(hard, has_ace)
+        if score >= DEALER_STANDS_ON:
+            return {min(score, 22): 1.0}
+
+        outcomes = {}
+        for value, odds in CARD_ODDS.items():
+            for final, final_odds in play(hard + value, has_ace or value == 1).items():
+                outcomes[final] = outcomes.get(final, 0.0) + odds * final_odds
+        return outcomes
+
+    # The hole card can't complete a natural, or the game would be over
+    hole_cards = {
+        value: odds for value, odds in CARD_ODDS.items()
+        if _score(upcard + value, upcard == 1 or value == 1) != 21
+    }
+    total = sum(hole_cards.values())
+
+    outcomes = {}
+    for value, odds in hole_cards.items():
+        for final, final_odds in play(upcard + value, upcard == 1 or value == 1).items():
+            outcomes[final] = outcomes.get(final, 0.0) + odds / total * final_odds
+    return outcomes
+
+def _player_values(upcard):
+    """ (stand EV, hit EV) per (soft, score) for the player against upcard """
+    dealer = _dealer_outcomes(upcard)
+
+    def stand(score):
+        return sum(
+            odds if final > 21 or final < score else -odds if final > score else 0.0
+            for final, odds in dealer.items()
+        )
+
+    @lru_cache(maxsize=None)
+    def hit(hard, has_ace):
+        value = 0.0
+        for card, odds in CARD_ODDS.items():
+            next_hard = hard + card
+            if next_hard > MAX_SCORE:
+                value -= odds
+            else:
+                next_ace = has_ace or card == 1
+                value += odds * max(stand(_score(next_hard, next_ace)), hit(next_hard, next_ace))
+        return value
+
+    values = {}
+    for hard in range(2, MAX_SCORE + 1):
+        for has_ace in (False, True):
+            score = _score(hard, has_ace)
+            soft = score != hard
+            values[soft, score] = (stand(score), hit(hard, has_ace))
+    return values
+
+def build_table():
+    """ Computes the flat table of (stand EV, hit EV) pairs """
+    table = [0.0] * TABLE_SIZE
+    for upcard in UPCARDS:
+        for (soft, score), (stand_ev, hit_ev) in _player_values(upcard).items():
+            index = _index(upcard, soft, score)
+            table[index] = stand_ev
+            table[index + 1] = hit_ev
+    return table
+
+def write_table(path=TABLE_PATH):
+    table = build_table()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(struct.pack(TABLE_FORMAT, *table))
+    return table
+
+@lru_cache(maxsize=None)
+def load_table(path=TABLE_PATH):
+    """ Reads the stored table, building it first if the file is missing """
+    try:
+        return struct.unpack(TABLE_FORMAT, path.read_bytes())
+    except FileNotFoundError:
+        return tuple(write_table(path))
+
+def _index(upcard, soft, score):
+    return (((upcard - 1) * 2 + soft) * (MAX_SCORE + 1) + score) * 2
+
+def lookup(score, soft, upcard):
+    """ (stand EV, hit EV) for a player score against a dealer upcard value """
+    table = load_table()
+    index = _index(upcard, bool(soft), score)
+    return table[index], table[index + 1]
+
+def hint(player_hand, dealer_upcard):
+    """ Best action and its expected value per unit bet for an active hand """
+    stand_ev, hit_ev = lookup(player_hand.score, player_hand.is_soft, dealer_upcard)
+    action = 'HIT' if hit_ev > stand_ev else 'STAND'
+
+    return {
+        'action': action,
+        'expected_value': round(max(stand_ev, hit_ev), 4),
+        'stand_ev': round(stand_ev, 4),
+        'hit_ev': round(hit_ev, 4),
+    }
+
+def mimic_dealer(player_hand, dealer_upcard):
+    """ Hits until the score reaches the dealer's stand, like the simulator policy """
+    return 'hit' if player_hand.score < DEALER_STANDS_ON else 'stand'
+
+def never_bust(player_hand, dealer_upcard):
+    """ Hits only when the next card can't bust the hand """
+    score = player_hand.score
+    return 'hit' if score <= 11 or (player_hand.is_soft and score < 18) else 'stand'
+
+def basic(player_hand, dealer_upcard):
+    """ Hits whenever the table gives hitting the higher EV """
+    stand_ev, hit_ev = lookup(player_hand.score, player_hand.is_soft, dealer_upcard)
+    return 'hit' if hit_ev > stand_ev else 'stand'
+
+# Named like the simulator's policies, for playing a hand server-side
+STRATEGIES = {
+    'mimic-dealer': mimic_dealer,
+    'never-bust': never_bust,
+    'basic': basic,
+}
@@ -1,3 +1,591 @@
-from django.test import TestCase
+import itertools
+import json
+import subprocess
+import sys
+import tempfile
+import warnings
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .archive import archive_games, summarize
+from .cache import LRUCache, get_state_cache
+from .gameplay import CARD_CODES, RANKS, Gameplay, Hand
+from .history import append_log, encode, replay
+from .metrics import REQUEST_QUERIES, REQUEST_SECONDS, MetricsMiddleware
+from .models import BalanceHistory, Game, PeriodStats, Player, Shoe
+from .replay import verify
+from .rollups import rebuild_stats
+from .settlement import payout
+from .simulate import simulate_parallel
+from .sockets import CLOSE_UNAUTHORIZED, game_socket
+from . import services
+
+class PlayerTestCase(TestCase):
+    """
+    A funded player with a client authenticated as them.
+
+    TestCase never commits, so the write-through cache updates and buffered
+    history rows queued with on_commit never run. The cache is cleared before
+    each test so every read starts cold.
+    """
+
+    def setUp(self):
+        get_state_cache().backend.clear()
+
+        self.user = User.objects.create_user(username='player', password='player-password')
+        Player.objects.create(user=self.user, balance=10 ** 6)
+
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        )
+
+    def play_games(self, count):
+        for _ in range(count):
+            services.play_hand(self.user, 1, strategy_name='basic')
+
+    def active_game(self):
+        """ Deals games until one isn't decided by a natural """
+        while True:
+            game = services.start_game(self.user, 1)
+            if game.status == 'ACTIVE':
+                return game
+
+class QueryBudgetTestCase(PlayerTestCase):
+    """
+    Checks that each endpoint stays within a fixed number of queries, however
+    many games the player has, so N+1 queries fail a test instead of shipping.
+
+    Budgets allow for a game that settles, adding to its hour and day stats
+    in up to three queries, and a shoe that reshuffles. Hit and stand also
+    lock the shoe and reload the game before drawing.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        # A player's first game also creates their shoe, which isn't counted
+        Shoe.for_player(self.user)
+
+        # Budgets are for a token that's already verified and cached
+        self.client.get('/api/games/')
+
+    @contextmanager
+    def assertMaxQueries(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), limit,
+            f"{len(queries)} queries, budget is {limit}:\n" + '\n'.join(queries)
+        )
+
+class GameQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_create(self):
+        with self.assertMaxQueries(12):
+            response = self.client.post('/api/games/', {'bet': 10}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_spots(self):
+        # The same queries as a single spot
+        with self.assertMaxQueries(12):
+            response = self.client.post('/api/games/', {'bets': [10] * 7}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_play(self):
+        with self.assertMaxQueries(12):
+            response = self.client.post(
+                '/api/games/play/', {'bet': 10, 'strategy': 'basic'}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_hit(self):
+        game = self.active_game()
+        with self.assertMaxQueries(11):
+            response = self.client.post(f'/api/games/{game.id}/hit/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stand(self):
+        game = self.active_game()
+        with self.assertMaxQueries(11):
+            response = self.client.post(f'/api/games/{game.id}/stand/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stand_spots(self):
+        games = services.start_spots(self.user, [1] * 7)
+        active = [game for game in games if game.status == 'ACTIVE']
+        if not active:
+            self.skipTest("Every spot was decided by a natural")
+
+        # The same queries as a single spot
+        with self.assertMaxQueries(12):
+            response = self.client.post(f'/api/games/{active[0].id}/stand/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve(self):
+        game = self.active_game()
+        with self.assertMaxQueries(1):
+            self.client.get(f'/api/games/{game.id}/')
+
+        # Served from the state cache the second time
+        with self.assertMaxQueries(0):
+            response = self.client.get(f'/api/games/{game.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_hint(self):
+        game = self.active_game()
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/api/games/{game.id}/hint/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_is_paged(self):
+        self.play_games(60)
+
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/games/')
+        self.assertEqual(len(response.data['results']), 50)
+
+        with self.assertMaxQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNone(response.data['next'])
+
+    def test_list_pages_games_created_together(self):
+        self.play_games(7)
+        Game.objects.update(created_at=Game.objects.first().created_at)
+
+        ids, url = [], '/api/games/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            ids.extend(result['id'] for result in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, sorted(Game.objects.values_list('id', flat=True), reverse=True))
+
+    async def test_export_streams_under_asgi(self):
+        await sync_to_async(self.play_games)(30)
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+
+        with patch('game.export.LINES_PER_WRITE', 10), warnings.catch_warnings():
+            # Django warns when it has to read a sync iterator into a list first
+            warnings.simplefilter('error')
+            response = await self.async_client.get(
+                '/api/games/export/?output=csv&records=games',
+                headers={'Authorization': f'Bearer {token}'},
+            )
+            pieces = [piece async for piece in response]
+
+        self.assertEqual(len(pieces), 4)
+        self.assertEqual(len(b''.join(pieces).splitlines()), 31)
+
+    def test_list_by_status(self):
+        self.play_games(5)
+        game = self.active_game()
+
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/games/?status=ACTIVE')
+        self.assertEqual([result['id'] for result in response.data['results']], [game.id])
+
+    def test_export(self):
+        self.play_games(30)
+
+        # Archived then live games, however many there are
+        with self.assertMaxQueries(2):
+            response = self.client.get('/api/games/export/?output=csv&records=games')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 31)
+
+class ProfileQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_profile(self):
+        self.play_games(30)
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/profile/')
+        self.assertEqual(response.data['games_played'], 30)
+
+    def test_history(self):
+        self.play_games(30)
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/profile/history/?page_size=10')
+        self.assertEqual(response.status_code, 200)
+
+    def test_leaderboard(self):
+        for number in range(20):
+            user = User.objects.create_user(username=f'player-{number}')
+            Player.objects.create(user=user, balance=number, games_played=25, win_rate=number)
+
+        with self.assertMaxQueries(7):
+            response = self.client.get('/api/leaderboard/?limit=20')
+        self.assertEqual(len(response.data['balance']), 20)
+
+        Player.objects.filter(user=self.user).update(balance=5)
+        self.assertEqual(self.client.get('/api/leaderboard/').data['me']['balance']['rank'], 15)
+        with override_settings(BLACKJACK_LEADERBOARD_RANK_LIMIT=14):
+            response = self.client.get('/api/leaderboard/')
+        self.assertIsNone(response.data['me']['balance']['rank'])
+
+    def test_stats(self):
+        self.play_games(30)
+
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/profile/stats/?range=7d')
+        player = Player.objects.get(user=self.user)
+        self.assertEqual(response.data['totals']['hands'], 30)
+        self.assertEqual(response.data['totals']['net'], player.net_profit)
+
+class RollupTests(PlayerTestCase):
+
+    def test_other_players_active_games_dont_hold_stats_back(self):
+        other = User.objects.create_user(username='other')
+        Player.objects.create(user=other, balance=1000)
+        game = services.start_game(other, 10)
+        while game.status != 'ACTIVE':
+            game = services.start_game(other, 10)
+
+        self.play_games(20)
+        stats = PeriodStats.objects.get(player=self.user, period='day')
+        self.assertEqual(stats.hands, 20)
+        self.assertEqual(stats.net, Player.objects.get(user=self.user).net_profit)
+
+    def test_rebuild_counts_live_and_archived_games_once(self):
+        self.play_games(3)
+        summarize(Game.objects.first()).save()
+        PeriodStats.objects.all().delete()
+
+        self.assertEqual(rebuild_stats(), 3)
+        stats = PeriodStats.objects.get(period='day')
+        self.assertEqual((stats.hands, stats.net), (3, Player.objects.get(user=self.user).net_profit))
+
+class HistoryReplayTests(PlayerTestCase):
+
+    def test_logs_of_dead_processes_replay_once(self):
+        player = Player.objects.get(user=self.user)
+        player.games_played = 2
+        player.save()
+        rows = [BalanceHistory(player=player, balance=100, game_number=number) for number in (1, 2, 3)]
+
+        # A finished child's pid, that no process is running under
+        child = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                               capture_output=True, text=True, check=True)
+        with tempfile.TemporaryDirectory() as directory:
+            log_base = Path(directory) / 'history.log'
+            append_log(log_base.with_name(f'history.log.{child.stdout.strip()}'), map(encode, rows))
+            append_log(log_base.with_name(f'history.log.{child.stdout.strip()}.flushing'),
+                       map(encode, rows[:1]))
+
+            # Game 3 was never settled, so its row rolled back
+            self.assertEqual(replay(log_base), 3)
+            self.assertEqual(replay(log_base), 0)
+            self.assertEqual(
+                list(log_base.parent.glob('history.log.*')), [log_base.with_name('history.log.lock')]
+            )
+
+        self.assertEqual(
+            list(BalanceHistory.objects.values_list('game_number', flat=True)), [1, 2]
+        )
+
+class ArchiveTests(PlayerTestCase):
+
+    def test_archived_games_leave_the_state_cache(self):
+        self.play_games(3)
+        game = Game.objects.first()
+        self.assertEqual(self.client.get(f'/api/games/{game.id}/').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_games(timezone.now(), batch_size=2), 3)
+
+        self.assertEqual(self.client.get(f'/api/games/{game.id}/').status_code, 404)
+
+class TokenCacheTests(PlayerTestCase):
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get('/api/games/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_views_share_the_checks(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        headers = {'Authorization': f'Bearer {token}'}
+        self.assertEqual((await self.async_client.get('/api/async/profile/', headers=headers)).status_code, 200)
+
+        self.user.is_active = False
+        await self.user.asave()
+        self.assertEqual((await self.async_client.get('/api/async/profile/', headers=headers)).status_code, 401)
+
+    async def test_socket_closes_when_its_token_expires(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        # Verified and cached, so the socket needs no database thread
+        await self.async_client.get('/api/games/', headers={'Authorization': f'Bearer {token}'})
+
+        messages = [
+            {'type': 'websocket.connect'},
+            {'type': 'websocket.receive', 'text': json.dumps({'action': 'authenticate', 'token': token})},
+            {'type': 'websocket.receive', 'text': '{"action": "hit"}'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+            if message.get('text') == '{"type": "authenticated"}':
+                # Past the token's expiry, for both the cache and simplejwt
+                later = timezone.now() + timedelta(days=1)
+                self.enterContext(patch('game.authentication.time.time', return_value=later.timestamp()))
+                self.enterContext(patch('rest_framework_simplejwt.tokens.aware_utcnow', return_value=later))
+
+        await game_socket({'type': 'websocket', 'path': '/ws/game/'}, receive, send)
+        self.assertEqual(sent, [
+            {'type': 'websocket.accept'},
+            {'type': 'websocket.send', 'text': '{"type": "authenticated"}'},
+            {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED},
+        ])
+
+    async def test_socket_needs_a_token_before_anything_else(self):
+        messages = [
+            {'type': 'websocket.connect'},
+            {'type': 'websocket.receive', 'text': '{"action": "new_game", "bet": 10}'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await game_socket({'type': 'websocket', 'path': '/ws/game/'}, receive, send)
+        self.assertEqual(sent, [
+            {'type': 'websocket.accept'},
+            {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED},
+        ])
+
+class ReplayTests(PlayerTestCase):
+
+    def test_games_replay_from_their_log(self):
+        for _ in range(20):
+            self.client.post('/api/games/play/', {'bet': 10, 'strategy': 'basic'}, format='json')
+            game = self.client.post('/api/games/', {'bets': [10, 20]}, format='json').data['games'][0]
+            if game['status'] == 'ACTIVE':
+                self.client.post(f"/api/games/{game['id']}/hit/")
+                self.client.post(f"/api/games/{game['id']}/stand/")
+
+        games = Game.objects.exclude(log='')
+        self.assertEqual(games.count(), 60)
+        for game in games:
+            self.assertEqual(verify(game), [], game.log)
+
+class SettlementTests(PlayerTestCase):
+
+    def stack_shoe(self, *ranks):
+        """ Puts cards of the given ranks on top of the player's shoe, in dealing order """
+        shoe = Shoe.for_player(self.user)
+        shoe.cards = bytes(CARD_CODES[rank, 'Spades'] for rank in ranks) + bytes(range(52))
+        shoe.position = 0
+        shoe.cut_card = len(shoe.cards)
+        shoe.save()
+
+    def assertSettled(self, game, status, balance):
+        player = Player.objects.get(user=self.user)
+        self.assertEqual(game.status, status)
+        self.assertEqual((player.balance, player.games_played), (balance, 1))
+
+    def test_payouts(self):
+        for status, score, cards, bet, expected in (
+            ('PLAYER_WON', 21, 2, 10, (25, 15, 0)),
+            # 3:2 rounds down on an odd bet
+            ('PLAYER_WON', 21, 2, 3, (7, 4, 0)),
+            ('PLAYER_WON', 21, 3, 10, (20, 10, 0)),
+            ('PLAYER_WON', 19, 2, 10, (20, 10, 0)),
+            ('TIE', 20, 2, 10, (10, 0, 0)),
+            ('DEALER_WON', 18, 2, 10, (0, 0, 10)),
+        ):
+            with self.subTest(status=status, score=score, cards=cards, bet=bet):
+                game = Game(status=status, player_score=score, player_cards=[{}] * cards, bet=bet)
+                self.assertEqual(payout(game), expected)
+
+    def test_natural_pays_three_to_two(self):
+        self.stack_shoe('A', 'K', 9, 7)
+        self.assertSettled(services.start_game(self.user, 10), 'PLAYER_WON', 10 ** 6 + 15)
+
+    def test_dealer_natural_wins_at_once(self):
+        self.stack_shoe(9, 7, 'A', 'K')
+        self.assertSettled(services.start_game(self.user, 10), 'DEALER_WON', 10 ** 6 - 10)
+
+    def test_tie_returns_the_bet(self):
+        self.stack_shoe(10, 7, 10, 7)
+        game = services.start_game(self.user, 10)
+        services.stand(game)
+        self.assertSettled(game, 'TIE', 10 ** 6)
+
+    def test_bust_is_settled(self):
+        self.stack_shoe(10, 6, 10, 7, 'K')
+        game = services.start_game(self.user, 10)
+        services.hit(game)
+        self.assertEqual(game.player_score, 26)
+        self.assertSettled(game, 'DEALER_WON', 10 ** 6 - 10)
+
+    def test_bets_never_overdraw(self):
+        Player.objects.filter(user=self.user).update(balance=15)
+        services.start_game(self.user, 10)
+        with self.assertRaisesMessage(ValueError, 'Insufficient funds'):
+            services.start_game(self.user, 10)
+        with self.assertRaisesMessage(ValueError, 'Insufficient funds'):
+            services.start_spots(self.user, [5, 5])
+        self.assertEqual(Player.objects.get(user=self.user).balance, 5)
+
+    def test_racing_actions_settle_once(self):
+        self.stack_shoe(10, 7, 10, 9)
+        game = services.start_game(self.user, 10)
+        # Loaded by two requests before either acted
+        first, second = Game.objects.get(pk=game.pk), Game.objects.get(pk=game.pk)
+
+        services.stand(first)
+        for action in (services.stand, services.hit):
+            with self.assertRaisesMessage(ValueError, 'Game is already complete'):
+                action(second)
+        self.assertSettled(first, 'DEALER_WON', 10 ** 6 - 10)
+
+class ShoeTests(PlayerTestCase):
+
+    def test_actions_draw_from_the_shoe_as_it_is_now(self):
+        game = self.active_game()
+        # Loaded before the player's other hands moved the shoe on
+        stale = Game.objects.select_related('shoe').get(pk=game.pk)
+        self.play_games(3)
+        position = Shoe.objects.get(player=self.user).position
+
+        services.hit(stale)
+        shoe = Shoe.objects.get(player=self.user)
+        self.assertEqual(shoe.position, position + 1)
+        self.assertEqual(Gameplay.encode_card(stale.player_cards[-1]), bytes(shoe.cards)[position])
+        self.assertEqual(verify(Game.objects.get(pk=game.pk)), [])
+
+class BetValidationTests(PlayerTestCase):
+
+    def test_bets_must_be_positive_whole_numbers(self):
+        for bet in (0, -100, True, 2.5, '10', {'bet': 10}):
+            with self.subTest(bet=bet):
+                response = self.client.post('/api/games/', {'bet': bet}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+                response = self.client.post('/api/games/', {'bets': [100, bet]}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+                response = self.client.post(
+                    '/api/games/play/', {'bet': bet, 'strategy': 'basic'}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(Player.objects.get(user=self.user).balance, 10 ** 6)
+        self.assertFalse(Game.objects.exists())
+
+    async def test_async_create_rejects_bad_bets(self):
+        token = RefreshToken.for_user(self.user).access_token
+        for body in ({'bet': 0}, {'bet': -5}, {'bet': {'bet': 10}}, {'bet': [10]}, [10], 'x'):
+            with self.subTest(body=body):
+                response = await self.async_client.post(
+                    '/api/async/games/', body, content_type='application/json',
+                    headers={'Authorization': f'Bearer {token}'}
+                )
+                self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(await Game.objects.aexists())
+
+class MetricsTests(PlayerTestCase):
+
+    def test_middleware_keeps_async_chain(self):
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: None)))
+
+    async def test_async_request_is_recorded(self):
+        before = REQUEST_SECONDS.series.get((('method', 'GET'), ('view', 'async-profile')), (0, 0, 0))[2]
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.get(
+            '/api/async/profile/', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        after = REQUEST_SECONDS.series[(('method', 'GET'), ('view', 'async-profile'))][2]
+        self.assertEqual(after, before + 1)
+
+    async def test_async_requests_count_their_queries(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        for path, view in (('/api/profile/', 'profile'), ('/api/async/profile/', 'async-profile')):
+            with self.subTest(view=view):
+                # Queries run in sync_to_async threads, on their own connections under a server
+                get_state_cache().backend.clear()
+                before = REQUEST_QUERIES.series.get((('view', view),), (0, 0, 0))[1]
+                await self.async_client.get(path, headers={'Authorization': f'Bearer {token}'})
+                self.assertGreater(REQUEST_QUERIES.series[(('view', view),)][1], before)
+
+    def test_metrics_are_private(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 403)
+
+class HandTests(SimpleTestCase):
+
+    @staticmethod
+    def reference_scores(cards):
+        """ Every total the cards can make, Aces as 1 or 11, as calculate_score used to find """
+        totals = {0}
+        for card in cards:
+            totals = {total + value for total in totals for value in Gameplay.get_card_value(card)}
+        return totals
+
+    def test_hand_matches_counting_every_ace_both_ways(self):
+        # Every hand of two to five cards by rank, so from no Aces up to five
+        for size in range(2, 6):
+            for ranks in itertools.combinations_with_replacement(RANKS, size):
+                cards = [{'rank': rank, 'suit': 'Hearts'} for rank in ranks]
+                totals = self.reference_scores(cards)
+                best = max((total for total in totals if total <= 21), default=min(totals))
+
+                hand = Hand.from_cards(cards)
+                with self.subTest(ranks=ranks):
+                    self.assertEqual(hand.score, best)
+                    self.assertEqual(hand.is_soft, best != min(totals))
+                    self.assertEqual(hand.is_blackjack, size == 2 and best == 21)
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_entries_expire_after_ttl(self):
+        cache = LRUCache(max_entries=2, ttl=60)
+        with patch('game.cache.time.monotonic', return_value=1000):
+            cache.set('a', 1)
+            cache.set('b', 2)
+            cache.get('a')
+            cache.set('c', 3)
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a'), 1)
+
+        with patch('game.cache.time.monotonic', return_value=1060):
+            self.assertIsNone(cache.get('a'))
+            self.assertIsNone(cache.get('c'))
+
+class SimulationTests(SimpleTestCase):
+
+    def test_seed_gives_same_result_on_any_worker_count(self):
+        params = dict(hands=30000, policy='mimic-dealer', lanes=2000, seed=7, shard_size=10000)
+        self.assertEqual(
+            simulate_parallel(workers=1, **params), simulate_parallel(workers=2, **params)
+        )
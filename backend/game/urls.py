@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'games', views.GameViewSet, basename='game')
@@ -10,4 +10,12 @@ urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
     path('profile/', views.get_profile, name='profile'),
+    path('profile/history/', views.BalanceHistoryList.as_view(), name='profile-history'),
+    path('profile/stats/', views.get_profile_stats, name='profile-stats'),
+    path('leaderboard/', views.get_leaderboard, name='leaderboard'),
+    path('metrics/', views.get_metrics, name='metrics'),
+    path('async/games/', async_views.create_game, name='async-game-create'),
+    path('async/games/<int:pk>/hit/', async_views.hit, name='async-game-hit'),
+    path('async/games/<int:pk>/stand/', async_views.stand, name='async-game-stand'),
+    path('async/profile/', async_views.get_profile, name='async-profile'),
 ]
\ No newline at end of file
@@ -1,11 +1,18 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import generics, viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
+from django.http import HttpResponse
 from django.contrib.auth import authenticate
 from .models import BalanceHistory, Game, Player
-from .serializers import UserSerializer, PlayerSerializer, GameSerializer
-from .gameplay import Gameplay
+from .serializers import (
+    UserSerializer, PlayerSerializer, GameSerializer, BalanceHistorySerializer, PeriodStatsSerializer
+)
+from .gameplay import CARD_VALUES, Gameplay, Hand
+from .cache import game_key, get_state_cache, profile_key
+from . import export, metrics, rollups, series, services, strategy
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -49,22 +56,23 @@ def login_user(request):
 def get_profile(request):
     """ Get user profile """
     
-    player = Player.objects.get(user=request.user)
+    data = get_state_cache().get_or_load(
+        profile_key(request.user.id), lambda: profile_data(request.user)
+    )
+    
+    return Response(data)
+
+def profile_data(user):
+    return profile_payload(Player.objects.select_related('user').get(user=user))
+
+def profile_payload(player):
     win_rate = 0 
     
     if player.games_played > 0:
         win_rate = round((player.games_won / player.games_played) * 100, 2)
     
-    # Gets balance history and adds game number
-    balance_history = BalanceHistory.objects.filter(player=player).order_by('id')
-    balance_history_data = [
-        {
-            'balance': history.balance,
-            'game_number': idx + 1
-        } for idx, history in enumerate(balance_history)
-    ]
-    
-    # Manually formats the data
+    # Manually formats the data, with the downsampled balance history kept
+    # up to date at settlement instead of every history row
     data = {
         'username': player.user.username,
         'balance': player.balance,
@@ -74,174 +82,292 @@ def get_profile(request):
         'total_lost': player.total_lost,
         'net_profit': player.net_profit,
         'win_rate': win_rate, 
-        'balance_history': balance_history_data
+        'balance_history': series.as_points(player.balance_series)
     }
     
+    return data
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_profile_stats(request):
+    """ Results per hour or day over a time window, from the rollup tables """
+    
+    window = request.query_params.get('range', '30d')
+    if window not in rollups.RANGES:
+        return Response(
+            {'error': f'Range must be one of: {", ".join(rollups.RANGES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+        
+    periods, totals = rollups.stats_window(request.user, window)
+    
+    return Response({
+        'range': window,
+        'period': totals.period,
+        'totals': PeriodStatsSerializer(totals).data,
+        'periods': PeriodStatsSerializer(periods, many=True).data,
+    })
+
+@api_view(['GET'])
+@permission_classes([metrics.MetricsPermission])
+def get_metrics(request):
+    """ This process's request metrics, in the Prometheus text format, for allowed clients """
+    
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
+
+LEADERBOARD_FIELDS = ('balance', 'net_profit', 'win_rate')
+
+def leaderboard_value(field, value):
+    # Win rate is stored in hundredths of a percent
+    return value / 100 if field == 'win_rate' else value
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_leaderboard(request):
+    """
+    Top players by balance, net profit and win rate, plus the caller's ranks.
+    A rank counts the players above the caller, so it's only counted up to
+    BLACKJACK_LEADERBOARD_RANK_LIMIT, past which it's None.
+    """
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+    me = Player.objects.get(user=request.user)
+    min_games = settings.BLACKJACK_LEADERBOARD_MIN_GAMES
+    rank_limit = settings.BLACKJACK_LEADERBOARD_RANK_LIMIT
+    data = {'me': {}}
+    
+    for field in LEADERBOARD_FIELDS:
+        # Each ranking walks its own index instead of sorting every player
+        ranked = Player.objects.all()
+        if field == 'win_rate':
+            ranked = ranked.filter(games_played__gte=min_games)
+            
+        top = ranked.select_related('user').only('user__username', field).order_by(f'-{field}')[:limit]
+        data[field] = [
+            {
+                'rank': rank,
+                'username': player.user.username,
+                'value': leaderboard_value(field, getattr(player, field))
+            } for rank, player in enumerate(top, start=1)
+        ]
+        
+        value = getattr(me, field)
+        if field == 'win_rate' and me.games_played < min_games:
+            data['me'][field] = None
+        else:
+            # Walks the index from the top down to the caller, stopping at the limit
+            above = ranked.filter(**{f'{field}__gt': value}).order_by()[:rank_limit].count()
+            data['me'][field] = {
+                'rank': above + 1 if above < rank_limit else None,
+                'value': leaderboard_value(field, value)
+            }
+    
     return Response(data)
 
+class BalanceHistoryPagination(CursorPagination):
+    page_size = 500
+    max_page_size = 5000
+    page_size_query_param = 'page_size'
+    ordering = 'id'
+
+class BalanceHistoryList(generics.ListAPIView):
+    """ Full-resolution balance history, one entry per game """
+    
+    serializer_class = BalanceHistorySerializer
+    pagination_class = BalanceHistoryPagination
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return BalanceHistory.objects.filter(player=self.request.player)
+
+class GamePagination(CursorPagination):
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    # Unique, so the cursor never skips or repeats games created together,
+    # and in creation order, as ids are handed out as games are created
+    ordering = '-id'
+
 class GameViewSet(viewsets.ModelViewSet):
     
     # Formats the data
     serializer_class = GameSerializer
     
+    # Pages the game list newest first, by keyset instead of offset
+    pagination_class = GamePagination
+    
     # Restricts access to authenticated users
     permission_classes = [permissions.IsAuthenticated]
     
     # Defines the queryset
     def get_queryset(self):
-        return Game.objects.filter(player=self.request.user)
+        queryset = Game.objects.filter(player=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            # The leftover deck of older games isn't part of the response
+            queryset = queryset.defer('deck')
+            
+        if self.action == 'list' and 'status' in self.request.query_params:
+            queryset = queryset.filter(status=self.request.query_params['status'])
+            
+        return queryset
 
+    def retrieve(self, request, pk=None):
+        """ Get a game, from the state cache when possible """
+        
+        return Response(self.get_game_state(pk))
+    
+    def get_game_state(self, pk):
+        return get_state_cache().get_or_load(
+            game_key(self.request.user.id, pk),
+            lambda: dict(self.get_serializer(self.get_object()).data)
+        )
+    
     def create(self, request):
-        """ Start a new game with a bet """
+        """ Start a new game with a bet, or one spot per bet in a list of bets """
         
-        player = Player.objects.get(user=request.user)
-        bet = request.data.get('bet', 10)
+        if 'bets' in request.data:
+            return self.create_spots(request)
+        
+        try:
+            game = services.start_game(request.user, request.data.get('bet', 10))
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        return Response(services.game_state(game), status=status.HTTP_201_CREATED)
 
-        # Prevents bypass from the frontend
-        if player.balance < bet:
+    def create_spots(self, request):
+        bets = request.data['bets']
+        
+        if not isinstance(bets, list):
+            return Response(
+                {'error': 'bets must be a list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            games = services.start_spots(request.user, bets)
+        except ValueError as e:
             return Response(
-                {'error': 'Insufficient funds'}, 
+                {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Creates a new deck
-        deck = Gameplay.create_deck()
-        
-        # Deals initial cards
-        player_cards, dealer_cards, remaining_deck = Gameplay.deal_initial_cards(deck)
-        
-        # Calculates initial scores
-        player_score = Gameplay.calculate_score(player_cards)
-        dealer_score = Gameplay.calculate_score(dealer_cards)
-        
-        # Checks if anyone has blackjack
-        initial_status = Gameplay.check_game_status(player_cards, dealer_cards, False)
-        
-        # Creates new game instance
-        game = Game.objects.create(
-            player=request.user,
-            deck=remaining_deck,
-            player_cards=player_cards,
-            dealer_cards=dealer_cards,
-            player_score=player_score,
-            dealer_score=dealer_score,
-            status=initial_status,
-            bet=bet
+        return Response(
+            {'games': [services.game_state(game) for game in games]},
+            status=status.HTTP_201_CREATED
         )
+
+    @action(detail=False, methods=['post'])
+    def play(self, request):
+        """ Start a game and play it through: a list of actions, or a strategy name """
         
-        # Updates player's balance
-        player.balance -= bet
-        player.save()
+        actions = request.data.get('actions')
+        strategy_name = request.data.get('strategy')
         
-        # Updates player's stats if natural blackjack is hit
-        if initial_status == 'PLAYER_WON':
-            self.update_game_statistics(game, player)
-            
-        serializer = self.get_serializer(game)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    
-    def update_game_statistics(self, game, player):
-        """ Update player's stats when game ends """
-        winnings = 0
-        
-        if game.status == 'PLAYER_WON':
-            if game.player_score == 21 and len(game.player_cards) == 2:
-                winnings = game.bet * 2.5
-            else:
-                winnings = game.bet * 2
-                
-            player.balance += winnings
-            player.total_won += (winnings - game.bet)
-            player.games_won += 1
-        
-        elif game.status == 'DEALER_WON':
-            player.total_lost += game.bet
+        if (actions is None) == (strategy_name is None):
+            return Response(
+                {'error': 'Give either actions or a strategy'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if actions is not None and not isinstance(actions, list):
+            return Response(
+                {'error': 'actions must be a list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            game, played = services.play_hand(
+                request.user, request.data.get('bet', 10), actions, strategy_name
+            )
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
             
-        else:
-            player.balance += game.bet
+        return Response({
+            **services.game_state(game),
+            'actions': played,
+            'settlement': services.settlement(game),
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """ Stream every game and balance change of the player as NDJSON or CSV """
         
-        player.games_played += 1
-        player.save()
+        output = request.query_params.get('output', 'ndjson')
+        records = request.query_params.get('records', 'all')
         
-        BalanceHistory.objects.create(player=player, balance=player.balance)
-        latest_history = BalanceHistory.objects.filter(player=player).order_by('-timestamp').first()
+        try:
+            lines = export.export_lines(request.user, output, records)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+        response = export.ExportResponse(lines, content_type=export.OUTPUTS[output])
+        response['Content-Disposition'] = f'attachment; filename="blackjack-{records}.{output}"'
+        return response
 
     @action(detail=True, methods=['post'])
     def hit(self, request, pk=None):
         """Player draws another card"""
         
         game = self.get_object()
-        
-        # Checks if game is still active
-        if game.status != 'ACTIVE':
-            return Response(
-                {'error': 'Game is already complete'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
         try:
-            deck, new_player_cards, new_card = Gameplay.hit(game.deck, game.player_cards)
-            
-            # Calculates new score
-            player_score = Gameplay.calculate_score(new_player_cards)
-            
-            # Checks game status
-            game_status = Gameplay.check_game_status(new_player_cards, game.dealer_cards, False)
-            
-            # Updates game
-            game.deck = deck
-            game.player_cards = new_player_cards
-            game.player_score = player_score
-            game.status = game_status
-            game.save()
-            
-            serializer = self.get_serializer(game)
-            return Response(serializer.data)
-            
+            services.hit(game)
         except ValueError as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+            
+        return Response(services.game_state(game))
 
-    @action(detail=True, methods=['post'])
-    def stand(self, request, pk=None):
-        """Player stands, dealer plays"""
+    @action(detail=True, methods=['get'])
+    def hint(self, request, pk=None):
+        """ Best action and expected value for the current hand """
         
-        game = self.get_object()
+        game = self.get_game_state(pk)
         
-        if game.status != 'ACTIVE':
+        if game['status'] != 'ACTIVE':
             return Response(
                 {'error': 'Game is already complete'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        try:
-            # Dealer plays their hand
-            final_deck, final_dealer_cards = Gameplay.play_dealer_hand(game.deck, game.dealer_cards)
-            
-            # Calculates final scores
-            dealer_score = Gameplay.calculate_score(final_dealer_cards)
             
-            # Determines final game status
-            game_status = Gameplay.check_game_status(game.player_cards, final_dealer_cards, True)
-
-            # Update game
-            game.deck = final_deck
-            game.dealer_cards = final_dealer_cards
-            game.dealer_score = dealer_score
-            game.status = game_status
-            game.save()
-            
-            # Updates player statistics
-            player = Player.objects.get(user=request.user)
-            self.update_game_statistics(game, player)
+        # Only the dealer's first card is face up
+        upcard = CARD_VALUES[Gameplay.encode_card(game['dealer_cards'][0])]
+        
+        return Response(strategy.hint(Hand.from_cards(game['player_cards']), upcard))
 
-            serializer = self.get_serializer(game)
-            return Response(serializer.data)
-            
+    @action(detail=True, methods=['post'])
+    def stand(self, request, pk=None):
+        """Player stands, dealer plays"""
+        
+        game = self.get_object()
+
+        try:
+            spots = services.stand(game)
         except ValueError as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+        
+        data = services.game_state(game)
+        
+        # Standing one spot finishes the other active spots of its session
+        if game.session:
+            data['spots'] = [services.game_state(spot) for spot in spots]
+            
+        return Response(data)
@@ -1,8 +1,9 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../context/Authentication';
 import Card from './Card';
 import Betting from './Betting';
 import gameApi from '../services/api';
+import createGameSocket from '../services/socket';
 import Profile from './Profile';
 
 const Game = () => {
@@ -13,7 +14,9 @@ const Game = () => {
     const [loading, setLoading] = useState(false);
     const [showProfile, setShowProfile] = useState(false);
 
-    // Fetches player profile and refreshes when game state changes
+    const socket = useRef(null);
+
+    // Fetches player profile once, later updates come with each game action
     useEffect(() => {
         const fetchProfile = async () => {
             try {
@@ -24,50 +27,57 @@ const Game = () => {
             }
         };
         fetchProfile();
-    }, [game]); 
+    }, []);
+
+    // Keeps one game channel open for the session
+    useEffect(() => {
+        socket.current = createGameSocket();
+        return () => socket.current.close();
+    }, []);
 
-    const startNewGame = async (bet) => {
+    // Sends an action over the game channel, or over HTTP if it isn't open
+    const play = async (sendOverSocket, sendOverHttp, errorMessage) => {
         try {
             setLoading(true);
             setError(null);
-            const newGame = await gameApi.createGame(bet);
-            setGame(newGame);
+            if (socket.current?.isOpen()) {
+                const frame = await sendOverSocket(socket.current);
+                setGame(frame.game);
+                setProfile((current) => ({ ...current, ...frame.player }));
+            } else {
+                setGame(await sendOverHttp());
+                setProfile(await gameApi.getProfile());
+            }
         } catch (err) {
-            setError('Failed to start new game');
+            setError(errorMessage);
             console.error(err);
         } finally {
             setLoading(false);
         }
     };
 
-    const hit = async () => {
+    const startNewGame = (bet) => play(
+        (channel) => channel.newGame(bet),
+        () => gameApi.createGame(bet),
+        'Failed to start new game'
+    );
+
+    const hit = () => {
         if (!game?.id) return;
-        try {
-            setLoading(true);
-            setError(null);
-            const updatedGame = await gameApi.hit(game.id);
-            setGame(updatedGame);
-        } catch (err) {
-            setError('Failed to hit');
-            console.error(err);
-        } finally {
-            setLoading(false);
-        }
+        return play(
+            (channel) => channel.hit(game.id),
+            () => gameApi.hit(game.id),
+            'Failed to hit'
+        );
     };
 
-    const stand = async () => {
+    const stand = () => {
         if (!game?.id) return;
-        try {
-            setLoading(true);
-            setError(null);
-            const updatedGame = await gameApi.stand(game.id);
-            setGame(updatedGame);
-        } catch (err) {
-            setError('Failed to stand');
-            console.error(err);
-        } finally {
-            setLoading(false);
-        }
+        return play(
+            (channel) => channel.stand(game.id),
+            () => gameApi.stand(game.id),
+            'Failed to stand'
+        );
     };
 
     return (
@@ -0,0 +1,48 @@
+const SOCKET_URL = 'ws://localhost:8000/ws/game/';
+
+// Opens one game channel for the session. The token goes in its first message,
+// not the URL, so it stays out of server access logs.
+const createGameSocket = () => {
+    const socket = new WebSocket(SOCKET_URL);
+    let authenticated = false;
+
+    // The server answers every message in order, so replies settle requests first in, first out
+    const pending = [];
+
+    socket.onmessage = (event) => {
+        const request = pending.shift();
+        if (!request) return;
+
+        const frame = JSON.parse(event.data);
+        if (frame.type === 'error') {
+            request.reject(new Error(frame.error));
+        } else {
+            request.resolve(frame);
+        }
+    };
+
+    socket.onclose = () => {
+        pending.splice(0).forEach((request) => request.reject(new Error('Game channel closed')));
+    };
+
+    const send = (message) => new Promise((resolve, reject) => {
+        pending.push({ resolve, reject });
+        socket.send(JSON.stringify(message));
+    });
+
+    socket.onopen = () => {
+        send({ action: 'authenticate', token: localStorage.getItem('token') })
+            .then(() => { authenticated = true; })
+            .catch(() => socket.close());
+    };
+
+    return {
+        isOpen: () => authenticated && socket.readyState === WebSocket.OPEN,
+        newGame: (bet) => send({ action: 'new_game', bet }),
+        hit: (gameId) => send({ action: 'hit', game: gameId }),
+        stand: (gameId) => send({ action: 'stand', game: gameId }),
+        close: () => socket.close()
+    };
+};
+
+export default createGameSocket;